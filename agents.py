@@ -1,69 +1,202 @@
 import pandas as pd
+import asyncio
 import io
 import os
 import csv
 from datetime import datetime
 import time
 import json
+import hashlib
+import queue
+import threading
 import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
 
-from openai import OpenAI
 from dotenv import load_dotenv
 load_dotenv()
-from config import gpt_model, gpt_model_adv, OUTPUT_TOKEN_LIMIT
+from config import gpt_model, gpt_model_adv, OUTPUT_TOKEN_LIMIT, MAX_PARALLEL_STEPS, RESPONSE_CACHE_ENABLED, PROMPT_CACHE_KEY_ENABLED
 
 from tools import execute_python_code
-from helper import make_json_safe, log_token_usage
+from query_engine import execute_query
+from sql_engine import run_sql
+from clients import get_client, get_async_client
+from response_cache import RESPONSE_CACHE, data_version
+from compaction import compact_tool_result
+from streaming import stream_options, collect_stream, collect_stream_async
+from metadata import select_metadata
+from telemetry import TELEMETRY, new_run_id, run_context, step_context, format_run_report
+from tracing import span, set_attributes, usage_attributes, dataframe_attributes, force_flush
 
 BASE_DIR = Path(__file__).resolve().parent
 
 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-LOG_PATH = f"logs/token_usage.csv"
 
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "execute_python_code",
-            "description": (
-                "Execute Python code inside the agent's Python environment. "
-                "The environment persists across tool calls within the same agent run. "
-                "The code must be valid Python and must include all needed imports, "
-                "data loading, and variable definitions. "
-                "If producing a final result, store it in a variable named `result_df` "
-                "and optional metadata in `result_meta`."
-            ),
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "code": {
-                        "type": "string",
-                        "description": (
-                            "The full Python script to execute. "
-                            "Must be self-contained, including imports and data loading. "
-                            "The final output should be assigned to `result_df`, "
-                            "with optional metadata assigned to `result_meta`."
-                        ),
-                    },
-                    "verbose": {
-                        "type": "boolean",
-                        "description": (
-                            "If true, the code execution output is printed to the console. "
-                            "If false, it is captured silently and returned through stdout."
-                        ),
-                        "default": False,
+PYTHON_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "execute_python_code",
+        "description": (
+            "Execute Python code inside the agent's Python environment. "
+            "The environment persists across tool calls within the same agent run: "
+            "variables, functions and imports defined by one call are available in the next, "
+            "unless a call is stopped for exceeding a time or memory limit, which resets it. "
+            "The code must be valid Python and must include all needed imports, "
+            "data loading, and variable definitions. "
+            "If producing a final result, store it in a variable named `result_df` "
+            "and optional metadata in `result_meta`."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "code": {
+                    "type": "string",
+                    "description": (
+                        "The full Python script to execute. "
+                        "Must be self-contained, including imports and data loading. "
+                        "The final output should be assigned to `result_df`, "
+                        "with optional metadata assigned to `result_meta`."
+                    ),
+                },
+                "verbose": {
+                    "type": "boolean",
+                    "description": (
+                        "If true, the code execution output is printed to the console. "
+                        "If false, it is captured silently and returned through stdout."
+                    ),
+                    "default": False,
+                },
+            },
+            "required": ["code"],
+        },
+    },
+}
+
+QUERY_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "execute_query",
+        "description": (
+            "Run a declarative filter / join / group-by / aggregate query over the preloaded "
+            "datasets (soi_panel, soi_metrics, soi_rollups, state_flows, county_flows, cpi_u, statefips_dict). "
+            "Prefer this over execute_python_code for simple aggregations: it runs in "
+            "milliseconds and its result becomes `result_df` directly."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "object",
+                    "description": "The query specification.",
+                    "properties": {
+                        "datasets": {
+                            "type": "array",
+                            "description": "Tables to use; the first is the base table.",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "name": {"type": "string", "description": "Dataset name, e.g. soi_panel."},
+                                    "alias": {"type": "string", "description": "Alias used in joins."},
+                                },
+                                "required": ["name"],
+                            },
+                        },
+                        "joins": {
+                            "type": "array",
+                            "description": (
+                                "Join specs: {type: inner|left|right|outer, left_dataset, right_dataset, "
+                                "on: [{left_column, right_column}]}."
+                            ),
+                            "items": {"type": "object"},
+                        },
+                        "filters": {
+                            "type": "object",
+                            "description": (
+                                "column -> {op: value}; ops: in, not_in, between, equals, not_equals, "
+                                "gt, gte, lt, lte. A bare value means equals, a bare list means in."
+                            ),
+                        },
+                        "group_by": {"type": "array", "items": {"type": "string"}},
+                        "columns": {
+                            "type": "array",
+                            "description": (
+                                "Without group_by and metrics the query returns the filtered rows; "
+                                "these are the columns to keep (default: all)."
+                            ),
+                            "items": {"type": "string"},
+                        },
+                        "metrics": {
+                            "type": "array",
+                            "description": (
+                                "Aggregates: {name, agg: sum|count|mean|min|max, column, filter}. "
+                                "`filter` restricts only this metric, e.g. {\"class\": \"inflow\"}."
+                            ),
+                            "items": {"type": "object"},
+                        },
+                        "derived_columns": {
+                            "type": "array",
+                            "description": "{name, expression} computed from metric columns, e.g. \"(inflow_n1 - outflow_n1) / total_n1\".",
+                            "items": {"type": "object"},
+                        },
+                        "sort": {
+                            "type": "array",
+                            "description": "{column, direction: asc|desc}.",
+                            "items": {"type": "object"},
+                        },
+                        "limit": {"type": "integer"},
                     },
+                    "required": ["datasets"],
+                },
+                "result_meta": {
+                    "type": "object",
+                    "description": "Metadata for the result table: `_summary` plus one description per column.",
                 },
-                "required": ["code"],
             },
+            "required": ["query", "result_meta"],
         },
-    }
-]
+    },
+}
+
+SQL_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "run_sql",
+        "description": (
+            "Run one DuckDB SELECT statement over the views soi_panel, soi_metrics, soi_rollups, "
+            "state_flows, county_flows, cpi_u and statefips_dict, which read the processed Parquet "
+            "files in place. Use it for joins, window functions and multi-stage "
+            "aggregations; filter on `year` and other columns in WHERE so only the "
+            "needed data is scanned. The result becomes `result_df` directly."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "sql": {
+                    "type": "string",
+                    "description": "A single SELECT (or WITH ... SELECT) statement in DuckDB SQL.",
+                },
+                "result_meta": {
+                    "type": "object",
+                    "description": "Metadata for the result table: `_summary` plus one description per column.",
+                },
+            },
+            "required": ["sql", "result_meta"],
+        },
+    },
+}
+
+# Tools offered to the DA agent; the DS agent only works on DA outputs
+TOOLS = [PYTHON_TOOL, QUERY_TOOL, SQL_TOOL]
+DS_TOOLS = [PYTHON_TOOL]
 
 def call_tool(tool_name: str, **kwargs) -> dict:
     if tool_name == "execute_python_code":
         return execute_python_code(**kwargs)
+    if tool_name == "execute_query":
+        return execute_query(**kwargs)
+    if tool_name == "run_sql":
+        return run_sql(**kwargs)
     return {"success": False, "error": f"Unknown tool: {tool_name}"}
 
 def load_prompt(file_name: str) -> str:
@@ -106,26 +239,142 @@ def describe_env(env: dict, env_meta: dict = {}) -> str:
                 lines.append(f"  Metadata: {env_meta[name]}")
     return "\n".join(lines)
 
-def run_python_da_agent(user_prompt: str, metadata_text:str = "", max_steps: int = 3, verbose: bool = False, api_key: str = None) -> str:
+def prefix_messages(system_prompt: str, metadata_text: str = "") -> list:
     """
-    user_prompt: the user's question or task.
-    metadata_text: text describing available data files and their schemas.
-    max_steps: max number of LLM ↔ tool iterations.
-    Returns: 
-    {
-        "dataframe": pd.DataFrame or None,
-        "metadata": dict,
-        "stdout": str,
-        "error": str or None
-        }
+    Leading messages of every agent call: the agent's system prompt, then
+    the run's metadata. Both are the same for every call of an agent in a
+    run (and the core metadata is the same across runs), so they form a
+    prompt prefix the provider can cache; call-specific content follows.
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    if metadata_text:
+        messages.append({"role": "system", "content": f"METADATA:\n{metadata_text}"})
+    return messages
+
+def llm_request(model: str, messages: list, **kwargs) -> dict:
+    """
+    chat.completions.create arguments, with a prompt_cache_key derived from
+    the stable prefix (the leading system messages) when enabled.
+    """
+    request = dict(model=model, messages=messages, **kwargs)
+    if PROMPT_CACHE_KEY_ENABLED:
+        prefix = "".join(m["content"] for m in messages if m["role"] == "system")
+        request["prompt_cache_key"] = hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:32]
+    return request
+
+# ---------------------------------------------------------------------------
+# Agent loops
+#
+# Each agent is written once as a generator that yields the work it needs
+# done and receives the result back:
+#     ("llm", create_kwargs)   -> chat completion response
+#     ("llm", create_kwargs, on_delta)
+#                              -> same, streamed: content deltas are passed to
+#                                 on_delta as they arrive
+#     ("tool", func, kwargs)   -> return value of func(**kwargs)
+# and finally returns the agent's output. drive_agent() runs a loop with a
+# synchronous client; drive_agent_async() with an AsyncOpenAI client, running
+# tools in a worker thread so the event loop is never blocked.
+# ---------------------------------------------------------------------------
+
+def _tool_name(request) -> str:
+    # DA tools are dispatched through call_tool
+    return request[2].get("tool_name") or request[1].__name__
+
+def _request_span(agent: str, request):
+    if request[0] == "llm":
+        return span("llm.call", agent=agent, **{"llm.model": request[1].get("model"), "llm.stream": bool(request[1].get("stream"))})
+    return span(f"tool.{_tool_name(request)}", agent=agent)
+
+def _record_call(agent: str, request, reply, seconds: float, current):
     """
-    if api_key is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+    Telemetry and span attributes for one request a driver served (LLM
+    wall time includes collecting a stream).
+    """
+    if request[0] == "llm":
+        TELEMETRY.record_llm(agent, request[1].get("model"), reply.usage, seconds)
+        set_attributes(current, **usage_attributes(reply.usage))
+    else:
+        success = reply.get("success") if isinstance(reply, dict) else None
+        TELEMETRY.record("tool", seconds, agent=agent, name=_tool_name(request), success=success)
+        if isinstance(reply, dict) and reply.get("render_seconds"):
+            # Part of the tool time above, broken out for the report
+            TELEMETRY.record("figure_render", reply["render_seconds"], agent=agent, name=_tool_name(request),
+                             success=True)
+        if isinstance(reply, dict):
+            # Query tools return their table; code execution leaves it in env
+            df = reply.get("dataframe")
+            if df is None:
+                df = (request[2].get("env") or {}).get("result_df")
+            set_attributes(
+                current,
+                **{"tool.success": success, "tool.figures": len(reply.get("figures") or [])},
+                **dataframe_attributes(df),
+            )
 
-    messages = [
-        {"role": "system", "content": da_agent_prompt},
-        {"role": "system", "content": metadata_text},
+def _record_failure(agent: str, request, error: Exception, seconds: float):
+    """
+    Telemetry for a request that raised, so failed calls count in latency and error totals.
+    """
+    if request[0] == "llm":
+        TELEMETRY.record_llm(agent, request[1].get("model"), None, seconds, error=type(error).__name__)
+    else:
+        TELEMETRY.record("tool", seconds, agent=agent, name=_tool_name(request), success=False,
+                         error=type(error).__name__)
+
+def drive_agent(loop, client, agent: str = "agent"):
+    with span(agent):
+        try:
+            request = next(loop)
+            while True:
+                start = time.perf_counter()
+                with _request_span(agent, request) as current:
+                    try:
+                        if request[0] == "llm":
+                            reply = client.chat.completions.create(**request[1])
+                            if request[1].get("stream"):
+                                reply = collect_stream(reply, request[2])
+                        else:
+                            reply = request[1](**request[2])
+                    except Exception as e:
+                        _record_failure(agent, request, e, time.perf_counter() - start)
+                        raise
+                    _record_call(agent, request, reply, time.perf_counter() - start, current)
+                request = loop.send(reply)
+        except StopIteration as stop:
+            return stop.value
+
+async def drive_agent_async(loop, client, agent: str = "agent"):
+    with span(agent):
+        try:
+            request = next(loop)
+            while True:
+                start = time.perf_counter()
+                with _request_span(agent, request) as current:
+                    try:
+                        if request[0] == "llm":
+                            reply = await client.chat.completions.create(**request[1])
+                            if request[1].get("stream"):
+                                reply = await collect_stream_async(reply, request[2])
+                        else:
+                            reply = await asyncio.to_thread(request[1], **request[2])
+                    except Exception as e:
+                        _record_failure(agent, request, e, time.perf_counter() - start)
+                        raise
+                    _record_call(agent, request, reply, time.perf_counter() - start, current)
+                request = loop.send(reply)
+        except StopIteration as stop:
+            return stop.value
+
+def _da_agent_loop(user_prompt: str, metadata_text: str = "", max_steps: int = 3, verbose: bool = False, use_cache: bool = RESPONSE_CACHE_ENABLED):
+    if use_cache:
+        # Keyed on the data version too, so a rebuilt panel is not answered from stale results
+        cache_key = RESPONSE_CACHE.key("da", gpt_model, da_agent_prompt, metadata_text, [user_prompt], extra=data_version())
+        cached = RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+    messages = prefix_messages(da_agent_prompt, metadata_text) + [
         {"role": "user", "content": user_prompt},
     ]
 
@@ -144,18 +393,11 @@ def run_python_da_agent(user_prompt: str, metadata_text:str = "", max_steps: int
             print("Message  before LLM call:", messages[-1])
         
         # Call model
-        resp = client.chat.completions.create(
-            model=gpt_model,   
+        resp = yield ("llm", llm_request(
+            model=gpt_model,
             messages=messages,
             tools=TOOLS,
-        )
-        if resp.usage is not None:
-            log_token_usage(
-                agent_name = "DA agent",
-                model = gpt_model,
-                usage = resp.usage,
-                LOG_PATH=LOG_PATH
-            )
+        ))
 
         msg = resp.choices[0].message
         if verbose:
@@ -196,7 +438,13 @@ def run_python_da_agent(user_prompt: str, metadata_text:str = "", max_steps: int
             
             if tool_name == "execute_python_code":
                 args['env'] = EXEC_ENV
-            result = call_tool(tool_name, **args)
+                args['preload_datasets'] = True
+            result = yield ("tool", call_tool, dict(tool_name=tool_name, **args))
+
+            # A successful query or SQL statement returns its table directly
+            if tool_name in ("execute_query", "run_sql") and result.get("success", False):
+                df = result.pop("dataframe")
+                meta = result.get("result_meta", {})
 
             # Update debug tracking
             last_stdout = result.get("stdout", "") or last_stdout
@@ -207,7 +455,7 @@ def run_python_da_agent(user_prompt: str, metadata_text:str = "", max_steps: int
             messages.append({
                 "role": "tool",
                 "tool_call_id": tc.id,
-                "content": json.dumps(result),
+                "content": compact_tool_result(result),
             })
 
             # If this was a successful code execution, check for result_df 
@@ -221,11 +469,15 @@ def run_python_da_agent(user_prompt: str, metadata_text:str = "", max_steps: int
                 meta = EXEC_ENV.get("result_meta", {})
             
             if df is not None: 
-                return { 
+                output = { 
                     "dataframe": df, 
                     "metadata": meta if isinstance(meta, dict) else {}, 
                     "stdout": result.get("stdout", ""), 
+                    "code": args.get("code") or args.get("sql") or json.dumps(args.get("query")),
                     "error": None, }
+                if use_cache:
+                    RESPONSE_CACHE.set(cache_key, output)
+                return output
             
 
     # If we hit max_steps without a plain answer
@@ -236,46 +488,46 @@ def run_python_da_agent(user_prompt: str, metadata_text:str = "", max_steps: int
         "error": last_error or f"Reached maximum steps ({max_steps}) without producing result_df.",
     }
 
-def run_data_scientist_agent(
+def run_python_da_agent(user_prompt: str, metadata_text:str = "", max_steps: int = 3, verbose: bool = False, api_key: str = None, use_cache: bool = RESPONSE_CACHE_ENABLED) -> str:
+    """
+    user_prompt: the user's question or task.
+    metadata_text: text describing available data files and their schemas.
+    max_steps: max number of LLM ↔ tool iterations.
+    use_cache: serve/store the result in the persistent response cache.
+    Returns: 
+    {
+        "dataframe": pd.DataFrame or None,
+        "metadata": dict,
+        "stdout": str,
+        "code": str (the script that produced the dataframe),
+        "error": str or None
+        }
+    """
+    loop = _da_agent_loop(user_prompt, metadata_text=metadata_text, max_steps=max_steps, verbose=verbose, use_cache=use_cache)
+    return drive_agent(loop, get_client(api_key), agent="DA agent")
+
+async def run_python_da_agent_async(user_prompt: str, metadata_text:str = "", max_steps: int = 3, verbose: bool = False, api_key: str = None, use_cache: bool = RESPONSE_CACHE_ENABLED) -> dict:
+    """
+    Async variant of run_python_da_agent using the shared AsyncOpenAI client.
+    """
+    loop = _da_agent_loop(user_prompt, metadata_text=metadata_text, max_steps=max_steps, verbose=verbose, use_cache=use_cache)
+    return await drive_agent_async(loop, get_async_client(api_key), agent="DA agent")
+
+def _data_scientist_agent_loop(
     user_prompt: str,
     env: dict,
     metadata_text: str = "",
     env_meta: dict = {},
     max_steps: int = 3,
     verbose: bool = False,
-    api_key: str = None) -> dict:
-    """
-    Run the data scientist agent with:
-      - env: runtime data objects
-      - metadata_text: long-form textual metadata
-      - env_meta: structured metadata dict for objects in env
-      - returns final answer + list of plots + tool logs
-
-    Returns:
-        {
-          "answer": str,
-          "figures": list[str],
-          "dataframe": pd.DataFrame or None,
-          "metadata": dict,
-          "tool_calls": list[dict],
-          "last_tool_output": dict
-        }
-    """
-
-    if api_key is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+    on_delta=None):
 
     user_content = (
         f"USER QUESTION:\n{user_prompt}\n\n"
         f"AVAILABLE OBJECTS IN env:\n{describe_env(env = env, env_meta = env_meta)}\n\n"
     )
 
-    if metadata_text:
-        user_content += f"ADDITIONAL LONG-FORM METADATA:\n{metadata_text}\n"
-
-    messages = [
-        {"role": "system", "content": ds_agent_prompt},
+    messages = prefix_messages(ds_agent_prompt, metadata_text) + [
         {"role": "user", "content": user_content},
     ]
 
@@ -287,19 +539,13 @@ def run_data_scientist_agent(
         if verbose:
             print(f"\n--- Data Scientist Agent: Step {step + 1} ---")
 
-        resp = client.chat.completions.create(
+        resp = yield ("llm", llm_request(
             model=gpt_model,
             messages=messages,
-            tools=TOOLS,
-        )
+            tools=DS_TOOLS,
+            **stream_options(on_delta),
+        ), on_delta)
 
-        if resp.usage is not None:
-            log_token_usage(
-                agent_name = "DS agent",
-                model = gpt_model,
-                usage = resp.usage,
-                LOG_PATH=LOG_PATH
-            )
 
         choice = resp.choices[0]
         message = choice.message
@@ -322,7 +568,7 @@ def run_data_scientist_agent(
                 if func_name == "execute_python_code":
                     code = args["code"]
 
-                    tool_output = execute_python_code(env = env, code = code, verbose = False)
+                    tool_output = yield ("tool", execute_python_code, dict(env = env, code = code, verbose = False))
                     last_tool_output = tool_output
 
                     tool_calls_log.append({
@@ -334,7 +580,6 @@ def run_data_scientist_agent(
 
                     # Collect figures
                     all_figures.extend(tool_output.get("figures", []))
-                    safe_output = make_json_safe(tool_output)
 
                     # Feed result back to model
                     messages.append(
@@ -342,7 +587,7 @@ def run_data_scientist_agent(
                             "role": "tool",
                             "tool_call_id": tool_call.id,
                             "name": func_name,
-                            "content": json.dumps(safe_output),
+                            "content": compact_tool_result(tool_output),
                         }
                     )
             continue
@@ -371,7 +616,80 @@ def run_data_scientist_agent(
         "last_tool_output": last_tool_output,
     }
 
-def run_orchestrator_agent(user_prompt: str, metadata_text: str, api_key: str = None) -> dict:
+def run_data_scientist_agent(
+    user_prompt: str,
+    env: dict,
+    metadata_text: str = "",
+    env_meta: dict = {},
+    max_steps: int = 3,
+    verbose: bool = False,
+    api_key: str = None,
+    on_delta=None) -> dict:
+    """
+    Run the data scientist agent with:
+      - env: runtime data objects
+      - metadata_text: long-form textual metadata
+      - env_meta: structured metadata dict for objects in env
+      - on_delta: optional callable(str); if given, completions are
+        streamed and each text delta is passed to it as it arrives
+      - returns final answer + list of plots + tool logs
+
+    Returns:
+        {
+          "answer": str,
+          "figures": list[FigureRef] (image bytes in FIGURE_CACHE),
+          "dataframe": pd.DataFrame or None,
+          "metadata": dict,
+          "tool_calls": list[dict],
+          "last_tool_output": dict
+        }
+    """
+    loop = _data_scientist_agent_loop(user_prompt, env, metadata_text=metadata_text, env_meta=env_meta, max_steps=max_steps, verbose=verbose, on_delta=on_delta)
+    return drive_agent(loop, get_client(api_key), agent="DS agent")
+
+async def run_data_scientist_agent_async(
+    user_prompt: str,
+    env: dict,
+    metadata_text: str = "",
+    env_meta: dict = {},
+    max_steps: int = 3,
+    verbose: bool = False,
+    api_key: str = None,
+    on_delta=None) -> dict:
+    """
+    Async variant of run_data_scientist_agent using the shared AsyncOpenAI client.
+    """
+    loop = _data_scientist_agent_loop(user_prompt, env, metadata_text=metadata_text, env_meta=env_meta, max_steps=max_steps, verbose=verbose, on_delta=on_delta)
+    return await drive_agent_async(loop, get_async_client(api_key), agent="DS agent")
+
+def _orchestrator_agent_loop(user_prompt: str, metadata_text: str, use_cache: bool = RESPONSE_CACHE_ENABLED):
+    if use_cache:
+        cache_key = RESPONSE_CACHE.key("orchestrator", gpt_model_adv, orchestrator_prompt, metadata_text, [user_prompt])
+        cached = RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+    # Metadata precedes the question so the prefix is shared across questions
+    messages = prefix_messages(orchestrator_prompt, metadata_text) + [
+        {"role": "user", "content": user_prompt},
+    ]
+
+    resp = yield ("llm", llm_request(
+        model=gpt_model_adv,
+        messages=messages,
+    ))
+
+
+    raw_content = resp.choices[0].message.content or ""
+    try:
+        plan_dict = json.loads(raw_content)
+    except json.JSONDecodeError:
+        raise ValueError(f"Orchestrator agent returned invalid JSON: {raw_content}")
+    if use_cache:
+        RESPONSE_CACHE.set(cache_key, plan_dict)
+    return plan_dict
+
+def run_orchestrator_agent(user_prompt: str, metadata_text: str, api_key: str = None, use_cache: bool = RESPONSE_CACHE_ENABLED) -> dict:
     """
     Call the orchestrator agent to produce a JSON plan with DA/DS prompts.
 
@@ -380,42 +698,51 @@ def run_orchestrator_agent(user_prompt: str, metadata_text: str, api_key: str =
       - clarification_question (str or None)
       - plan (list of steps, possibly empty)
     """
+    return drive_agent(_orchestrator_agent_loop(user_prompt, metadata_text, use_cache=use_cache), get_client(api_key), agent="Orchestrator agent")
+
+async def run_orchestrator_agent_async(user_prompt: str, metadata_text: str, api_key: str = None, use_cache: bool = RESPONSE_CACHE_ENABLED) -> dict:
+    """
+    Async variant of run_orchestrator_agent using the shared AsyncOpenAI client.
+    """
+    return await drive_agent_async(_orchestrator_agent_loop(user_prompt, metadata_text, use_cache=use_cache), get_async_client(api_key), agent="Orchestrator agent")
+
+def _summarize_agent_loop(ds_report: dict, user_prompt: str = "", metadata_text: str = "", verbose: bool = False, use_cache: bool = RESPONSE_CACHE_ENABLED, on_delta=None):
+    ds_report_str = json.dumps(ds_report, indent = 2, ensure_ascii=False)
 
-    if api_key is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+    if use_cache:
+        cache_key = RESPONSE_CACHE.key("summarize", gpt_model_adv, summarize_prompt, metadata_text, [user_prompt, ds_report_str])
+        cached = RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            if on_delta is not None:
+                on_delta(cached)
+            return cached
 
-    user_payload = (
+    user_content = (
         f"{user_prompt}\n\n"
-        f"METADATA: \n {metadata_text} \n"
+        f"Data Scientist Report(ds_report_dict):\n{ds_report_str}\n\n"
     )
 
-    messages = [
-        {"role": "system", "content": orchestrator_prompt},
-        {"role": "user", "content": user_payload},
+    messages = prefix_messages(summarize_prompt, metadata_text) + [
+        {"role": "user", "content":user_content}
     ]
 
-    resp = client.chat.completions.create(
-        model=gpt_model_adv,
-        messages=messages,
-    )
+    resp = yield ("llm", llm_request(
+        model = gpt_model_adv,
+        messages = messages,
+        max_completion_tokens = OUTPUT_TOKEN_LIMIT,
+        **stream_options(on_delta),
+    ), on_delta)
 
-    if resp.usage is not None:
-        log_token_usage(
-            agent_name = "Orchestrator agent",
-            model = gpt_model_adv,
-            usage = resp.usage,
-            LOG_PATH=LOG_PATH
-        )
 
-    raw_content = resp.choices[0].message.content or ""
-    try:
-        plan_dict = json.loads(raw_content)
-    except json.JSONDecodeError:
-        raise ValueError(f"Orchestrator agent returned invalid JSON: {raw_content}")
-    return plan_dict
+    raw_content = resp.choices[0].message.content.strip() or ""
+    if verbose:
+        print(f"Key Findings \n {raw_content}")
+
+    if use_cache:
+        RESPONSE_CACHE.set(cache_key, raw_content)
+    return raw_content
 
-def run_summarize_agent(ds_report: dict, user_prompt: str = "",  metadata_text:str = "", verbose: bool = False, api_key: str = None) -> str:
+def run_summarize_agent(ds_report: dict, user_prompt: str = "",  metadata_text:str = "", verbose: bool = False, api_key: str = None, use_cache: bool = RESPONSE_CACHE_ENABLED, on_delta=None) -> str:
     """
     Call an agent to summarize the findings from the data scientist report into bullet points.
 
@@ -430,71 +757,277 @@ def run_summarize_agent(ds_report: dict, user_prompt: str = "",  metadata_text:s
         where each value is a string produced by the Data Scientist Agent.
     metadata_text : str, optional
         Long-form metadata about the data and variables (e.g. schemas, definitions).
+    on_delta : callable, optional
+        If given, the summary is streamed and each text delta is passed to
+        on_delta(str) as it arrives; the full text is still returned.
     """
+    loop = _summarize_agent_loop(ds_report, user_prompt=user_prompt, metadata_text=metadata_text, verbose=verbose, use_cache=use_cache, on_delta=on_delta)
+    return drive_agent(loop, get_client(api_key), agent="Summarize agent")
 
-    if api_key is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
-    
-    ds_report_str = json.dumps(ds_report, indent = 2, ensure_ascii=False)
+async def run_summarize_agent_async(ds_report: dict, user_prompt: str = "",  metadata_text:str = "", verbose: bool = False, api_key: str = None, use_cache: bool = RESPONSE_CACHE_ENABLED, on_delta=None) -> str:
+    """
+    Async variant of run_summarize_agent using the shared AsyncOpenAI client.
+    """
+    loop = _summarize_agent_loop(ds_report, user_prompt=user_prompt, metadata_text=metadata_text, verbose=verbose, use_cache=use_cache, on_delta=on_delta)
+    return await drive_agent_async(loop, get_async_client(api_key), agent="Summarize agent")
 
-    user_content = (
-        f"{user_prompt}\n\n"
-        f"Data Scientist Report(ds_report_dict):\n{ds_report_str}\n\n"
-    )
+def _dependency_inputs(depends_on: list, shared_env: dict, shared_meta: dict):
+    """
+    Tables (df_<step_id>) and their metadata that a DS step may use.
+    """
+    ds_env = {}
+    ds_meta = {}
+    for dep in depends_on:
+        try:
+            ds_env[f"df_{dep}"] = shared_env[f"df_{dep}"]
+            ds_meta[f"df_{dep}"] = shared_meta[f"df_{dep}"]
+        except: 
+            pass
+    return ds_env, ds_meta
 
-    if metadata_text:
-        user_content += f"Additional METADATA:\n{metadata_text}\n"
+def run_plan_step(
+    step: dict,
+    shared_env: dict,
+    shared_meta: dict,
+    metadata_text: str | None = None,
+    verbose: bool = False,
+    api_key: str = None,
+    use_cache: bool = RESPONSE_CACHE_ENABLED,
+    on_event=None,
+) -> dict:
+    """
+    Run the DA and/or DS part of one orchestrator plan step.
 
-    messages = [
-        {"role": "system", "content": summarize_prompt},
-        {"role": "user", "content":user_content}
-    ]
+    Reads the outputs of the step's dependencies from shared_env/shared_meta,
+    which the scheduler only fills in once those steps have finished.
+    With metadata_text=None the DA agent gets the metadata sections
+    relevant to this step only. With on_event, the DS answer is streamed
+    as {"type": "ds_delta", "step_id", "text"} events.
 
-    resp = client.chat.completions.create(
-        model = gpt_model_adv,
-        messages = messages,
-        max_completion_tokens = OUTPUT_TOKEN_LIMIT
-    )
+    Returns:
+        {
+          "output": dict returned by the last agent that ran (or None),
+          "ds_answer": str or None,
+          "figures": list[FigureRef],
+        }
+    """
+    step_id = step['step_id']
+    goal = step['goal']
+    da_prompt = step['da_prompt']
+    ds_prompt = step['ds_prompt']
+    depends_on = step['depends_on']
 
-    if resp.usage is not None:
-        log_token_usage(
-            agent_name = "Summarize agent",
-            model = gpt_model,
-            usage = resp.usage,
-            LOG_PATH=LOG_PATH
-        )
+    output = None
+    ds_answer = None
+    figures = []
 
-    raw_content = resp.choices[0].message.content.strip() or ""
     if verbose:
-        print(f"Key Findings \n {raw_content}")
+        print(f"\n---Executing Step {step_id}: {goal} ---\n")
 
-    return raw_content
+    if da_prompt is not None:
+        if verbose:
+            print(f"[DA] Running DA step {step_id} with prompt:\n{da_prompt}\n")
+
+        if metadata_text is None:
+            metadata_text = select_metadata(f"{goal}\n{da_prompt}")
+        output = run_python_da_agent(
+            user_prompt=da_prompt,
+            metadata_text=metadata_text,
+            verbose=verbose,
+            api_key=api_key,
+            use_cache=use_cache,
+        )
 
-def run_all_agents(
-    original_prompt: str,
-    metadata_text: str,
-    focus: str|None = None,
-    max_steps: int = 100,
+    if ds_prompt is not None:
+        if verbose:
+            print(f"[DS] Running DS step {step_id} with prompt:\n{ds_prompt}\n")
+            print(f"[DS] Depends on: {depends_on}")
+
+        ds_env, ds_meta = _dependency_inputs(depends_on, shared_env, shared_meta)
+        on_delta = None
+        if on_event is not None:
+            on_delta = lambda text: on_event({"type": "ds_delta", "step_id": step_id, "text": text})
+        output = run_data_scientist_agent(
+            user_prompt=ds_prompt,
+            env=ds_env,
+            env_meta=ds_meta,
+            max_steps = 5,
+            verbose=verbose,
+            api_key=api_key,
+            on_delta=on_delta,
+        )
+        if verbose:
+            print(f"[DS] Output of DS step {step_id}:\n{output.get('answer')}\n")
+
+        ds_answer = output.get("answer")
+        figures = output.get("figures", [])
+
+    return {"output": output, "ds_answer": ds_answer, "figures": figures}
+
+async def run_plan_step_async(
+    step: dict,
+    shared_env: dict,
+    shared_meta: dict,
+    metadata_text: str | None = None,
     verbose: bool = False,
-    OpenAI_API_key: str = None,
+    api_key: str = None,
+    use_cache: bool = RESPONSE_CACHE_ENABLED,
 ) -> dict:
     """
-    Run the full pipeline: Orchestrator -> DA/DS agents as per plan.
-    Returns a dict with final results and reports from each step.
+    Async variant of run_plan_step.
     """
+    output = None
+    ds_answer = None
+    figures = []
 
-    if OpenAI_API_key is None:
-        OpenAI_API_key = os.getenv("OPENAI_API_KEY")
+    if verbose:
+        print(f"\n---Executing Step {step['step_id']}: {step['goal']} ---\n")
+
+    if step['da_prompt'] is not None:
+        if metadata_text is None:
+            metadata_text = select_metadata(f"{step['goal']}\n{step['da_prompt']}")
+        output = await run_python_da_agent_async(
+            user_prompt=step['da_prompt'],
+            metadata_text=metadata_text,
+            verbose=verbose,
+            api_key=api_key,
+            use_cache=use_cache,
+        )
 
-    user_prompt = build_focus(original_question=original_prompt, focus= focus)
+    if step['ds_prompt'] is not None:
+        ds_env, ds_meta = _dependency_inputs(step['depends_on'], shared_env, shared_meta)
+        output = await run_data_scientist_agent_async(
+            user_prompt=step['ds_prompt'],
+            env=ds_env,
+            env_meta=ds_meta,
+            max_steps = 5,
+            verbose=verbose,
+            api_key=api_key,
+        )
+        ds_answer = output.get("answer")
+        figures = output.get("figures", [])
 
-    orchestrator_output = run_orchestrator_agent(
-        user_prompt=user_prompt,
-        metadata_text=metadata_text,
-        api_key=OpenAI_API_key
+    return {"output": output, "ds_answer": ds_answer, "figures": figures}
+
+def plan_order(plan: list) -> list:
+    """
+    Steps of the plan in a dependency-respecting order (stable w.r.t. plan
+    order). Dependencies on step ids that are not in the plan are ignored.
+
+    Raises ValueError if the dependencies are circular.
+    """
+    steps = {step['step_id']: step for step in plan}
+    done = set()
+    ordered = []
+    while len(ordered) < len(plan):
+        progress = False
+        for step_id, step in steps.items():
+            if step_id in done:
+                continue
+            if all(dep in done or dep not in steps for dep in (step.get('depends_on') or [])):
+                ordered.append(step)
+                done.add(step_id)
+                progress = True
+        if not progress:
+            pending = [step_id for step_id in steps if step_id not in done]
+            raise ValueError(f"Orchestrator plan has circular dependencies among steps {pending}.")
+    return ordered
+
+def _run_in_step(run_step, step):
+    with step_context(step['step_id']), _step_span(step):
+        return run_step(step)
+
+def _step_span(step: dict):
+    return span(
+        f"step {step['step_id']}",
+        **{
+            "step.id": str(step['step_id']),
+            "step.goal": step.get('goal') or "",
+            "step.depends_on": ",".join(str(d) for d in step.get('depends_on') or []),
+        },
     )
 
+def schedule_plan(plan: list, run_step, on_step_done=None, max_concurrency: int = MAX_PARALLEL_STEPS) -> dict:
+    """
+    Run plan steps as a dependency graph.
+
+    Every step whose `depends_on` steps have all finished is submitted to a
+    thread pool, up to `max_concurrency` at a time, so independent steps
+    overlap their LLM round trips. Dependencies on step ids that are not
+    in the plan are ignored.
+
+    Args:
+        plan: list of step dicts with `step_id` and `depends_on`.
+        run_step: callable(step) -> result, run in a worker thread.
+        on_step_done: optional callable(step, result), called in the
+            scheduling thread as each step finishes and before any of its
+            dependents are started.
+        max_concurrency: maximum number of steps running at once.
+
+    Returns:
+        {step_id: result}
+    """
+    plan_order(plan)
+    steps = {step['step_id']: step for step in plan}
+    pending = dict(steps)
+    results = {}
+    running = {}
+
+    def ready(step):
+        return all(dep in results or dep not in steps for dep in (step.get('depends_on') or []))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        while pending or running:
+            # Submit in plan order so ties go to earlier steps
+            for step_id, step in list(pending.items()):
+                if len(running) >= max(1, max_concurrency):
+                    break
+                if ready(step):
+                    # copy_context carries the run id into the worker thread
+                    running[pool.submit(contextvars.copy_context().run, _run_in_step, run_step, step)] = step_id
+                    del pending[step_id]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step_id = running.pop(future)
+                results[step_id] = future.result()
+                if on_step_done is not None:
+                    on_step_done(steps[step_id], results[step_id])
+
+    return results
+
+async def schedule_plan_async(plan: list, run_step, on_step_done=None, max_concurrency: int = MAX_PARALLEL_STEPS) -> dict:
+    """
+    Async variant of schedule_plan: run_step is a coroutine function, and
+    each step is a task that waits for its dependencies' tasks.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    tasks = {}
+    results = {}
+
+    async def run(step):
+        for dep in step.get('depends_on') or []:
+            if dep in tasks:
+                await tasks[dep]
+        async with semaphore:
+            with step_context(step['step_id']), _step_span(step):
+                result = await run_step(step)
+        results[step['step_id']] = result
+        if on_step_done is not None:
+            on_step_done(step, result)
+        return result
+
+    # Dependencies are created before their dependents, so every awaited task exists
+    for step in plan_order(plan):
+        tasks[step['step_id']] = asyncio.create_task(run(step))
+    await asyncio.gather(*tasks.values())
+    return results
+
+def _check_plan(orchestrator_output: dict, max_steps: int, verbose: bool = False):
+    """
+    Validate the orchestrator output. Returns (plan, clarification) where
+    clarification is the result dict to return instead of running the plan.
+    """
     plan = orchestrator_output.get("plan", [])
 
     if len(plan) >= max_steps:
@@ -510,76 +1043,311 @@ def run_all_agents(
             "type": "clarification",
             "question": orchestrator_output['clarification_question']
         }
-        return results
+        return plan, results
+    return plan, None
 
-    shared_env = {}
-    shared_meta = {}
+def _publish_step(shared_env: dict, shared_meta: dict):
+    """
+    on_step_done callback that makes a step's table visible to its dependents.
+    """
+    def publish(step, step_result):
+        output = step_result["output"]
+        try:
+            shared_env[f"df_{step['step_id']}"] = output.get("dataframe")
+            shared_meta[f"df_{step['step_id']}"] = output.get("metadata")
+        except:
+            pass
+    return publish
+
+def _step_events(step: dict, step_result: dict) -> list:
+    """
+    Progress events for a finished step: step_done, then one per figure.
+    """
+    events = [{
+        "type": "step_done",
+        "step_id": step['step_id'],
+        "goal": step['goal'],
+        "ds_answer": step_result["ds_answer"],
+    }]
+    for fig in step_result["figures"]:
+        events.append({"type": "figure", "step_id": step['step_id'], "figure": fig})
+    return events
+
+def _collect_results(plan: list, step_results: dict, shared_env: dict, shared_meta: dict):
+    """
+    Assemble step outputs in plan order, independent of completion order.
+    """
+    ordered_env = {}
+    ordered_meta = {}
     ds_report = {}
     all_figures = []
-
     for step in plan:
         step_id = step['step_id']
-        goal = step['goal']
-        da_prompt = step['da_prompt']
-        ds_prompt = step['ds_prompt']
-        depends_on = step['depends_on']
-
-        if verbose:
-            print(f"\n---Executing Step {step_id}: {goal} ---\n")
+        step_result = step_results[step_id]
+        if f"df_{step_id}" in shared_env:
+            ordered_env[f"df_{step_id}"] = shared_env[f"df_{step_id}"]
+            ordered_meta[f"df_{step_id}"] = shared_meta[f"df_{step_id}"]
+        if step['ds_prompt'] is not None:
+            ds_report[f"ds_step_{step_id}"] = step_result["ds_answer"]
+            all_figures.extend(step_result["figures"])
+    return ordered_env, ordered_meta, ds_report, all_figures
 
-        if da_prompt is not None:
-            if verbose:
-                print(f"[DA] Running DA step {step_id} with prompt:\n{da_prompt}\n")
-
-            output = run_python_da_agent(
-                user_prompt=da_prompt,
+def run_all_agents(
+    original_prompt: str,
+    metadata_text: str | None = None,
+    focus: str|None = None,
+    max_steps: int = 100,
+    verbose: bool = False,
+    OpenAI_API_key: str = None,
+    max_concurrency: int = MAX_PARALLEL_STEPS,
+    use_cache: bool = RESPONSE_CACHE_ENABLED,
+    on_event=None,
+) -> dict:
+    """
+    Run the full pipeline: Orchestrator -> DA/DS agents as per plan.
+    Independent plan steps run concurrently (up to max_concurrency);
+    results are still reported in plan order. With use_cache, orchestrator
+    plans, DA results and summaries are served from the response cache
+    when the same question was answered before. With metadata_text=None,
+    the metadata sections relevant to the question are selected once (see
+    metadata.select_metadata) and shared by the orchestrator and DA steps.
+
+    on_event, if given, is called with progress events as the pipeline
+    runs: {"type": "plan"}, {"type": "step_done"} and {"type": "figure"}
+    per step, streamed {"type": "ds_delta"} / {"type": "summary_delta"}
+    text, and finally {"type": "done", "result": ...}. Steps run in worker
+    threads, so on_event must be thread-safe.
+    Returns a dict with final results and reports from each step, and a
+    "telemetry" report of where the run's time and tokens went (see
+    telemetry.TELEMETRY.run_summary).
+    """
+    run_id = new_run_id()
+    try:
+        with run_context(run_id), span("question", **{"question": original_prompt, "run_id": run_id}):
+            results = _run_pipeline(
+                original_prompt,
                 metadata_text=metadata_text,
+                focus=focus,
+                max_steps=max_steps,
                 verbose=verbose,
-                api_key=OpenAI_API_key,
+                OpenAI_API_key=OpenAI_API_key,
+                max_concurrency=max_concurrency,
+                use_cache=use_cache,
+                on_event=on_event,
             )
+    finally:
+        # Also on failure, so the run's records are released and written out
+        report = _finish_run(run_id, verbose=verbose)
+    results["telemetry"] = report
 
-        if ds_prompt is not None:
-            if verbose:
-                print(f"[DS] Running DS step {step_id} with prompt:\n{ds_prompt}\n")
-                print(f"[DS] Depends on: {depends_on}")
-
-            ds_env = {}
-            ds_meta = {}
-            for dep in depends_on:
-                try:
-                    ds_env[f"df_{dep}"] = shared_env[f"df_{dep}"]
-                    ds_meta[f"df_{dep}"] = shared_meta[f"df_{dep}"]
-                except: 
-                    pass
-            output = run_data_scientist_agent(
-                user_prompt=ds_prompt,
-                env=ds_env,
-                env_meta=ds_meta,
-                max_steps = 5,
-                verbose=verbose,
-                api_key=OpenAI_API_key,
-            )
-            if verbose:
-                print(f"[DS] Output of DS step {step_id}:\n{output.get('answer')}\n")
+    if on_event is not None:
+        on_event({"type": "done", "result": results})
+    return results
 
-            ds_report[f"ds_step_{step_id}"] = output.get("answer")
-            all_figures.extend(output.get("figures",[]))
-        
-        try:
-            shared_env[f"df_{step_id}"] = output.get("dataframe")
-            shared_meta[f"df_{step_id}"] = output.get("metadata")
-        except:
-            pass
+def _finish_run(run_id: str, verbose: bool = False) -> dict:
+    report = TELEMETRY.run_summary(run_id)
+    TELEMETRY.flush()
+    force_flush()
+    if verbose:
+        print(format_run_report(report))
+    return report
+
+def _run_pipeline(
+    original_prompt: str,
+    metadata_text: str | None,
+    focus: str | None,
+    max_steps: int,
+    verbose: bool,
+    OpenAI_API_key: str,
+    max_concurrency: int,
+    use_cache: bool,
+    on_event=None,
+) -> dict:
+    if OpenAI_API_key is None:
+        OpenAI_API_key = os.getenv("OPENAI_API_KEY")
+
+    user_prompt = build_focus(original_question=original_prompt, focus= focus)
+    if metadata_text is None:
+        # Selected once per question: every agent call then shares this prefix
+        metadata_text = select_metadata(user_prompt)
+
+    orchestrator_output = run_orchestrator_agent(
+        user_prompt=user_prompt,
+        metadata_text=metadata_text,
+        api_key=OpenAI_API_key,
+        use_cache=use_cache,
+    )
+
+    plan, clarification = _check_plan(orchestrator_output, max_steps, verbose=verbose)
+    if clarification is not None:
+        return clarification
+    if on_event is not None:
+        on_event({"type": "plan", "plan": plan})
+
+    shared_env = {}
+    shared_meta = {}
+    publish = _publish_step(shared_env, shared_meta)
+
+    def run_step(step):
+        return run_plan_step(
+            step,
+            shared_env=shared_env,
+            shared_meta=shared_meta,
+            metadata_text=metadata_text,
+            verbose=verbose,
+            api_key=OpenAI_API_key,
+            use_cache=use_cache,
+            on_event=on_event,
+        )
+
+    def on_step_done(step, step_result):
+        publish(step, step_result)
+        if on_event is not None:
+            for event in _step_events(step, step_result):
+                on_event(event)
+
+    step_results = schedule_plan(
+        plan, run_step,
+        on_step_done=on_step_done,
+        max_concurrency=max_concurrency,
+    )
+    stat_df, stat_metadata, ds_report, all_figures = _collect_results(plan, step_results, shared_env, shared_meta)
 
-    summary_text = run_summarize_agent(ds_report=ds_report, user_prompt=user_prompt, verbose = verbose, api_key=OpenAI_API_key)
+    on_delta = None
+    if on_event is not None:
+        on_delta = lambda text: on_event({"type": "summary_delta", "text": text})
+    summary_text = run_summarize_agent(ds_report=ds_report, user_prompt=user_prompt, verbose = verbose, api_key=OpenAI_API_key, use_cache=use_cache, on_delta=on_delta)
 
     results = {
         "summary": summary_text,
-        "stat_df": shared_env,
-        "stat_metadata": shared_meta,
+        "stat_df": stat_df,
+        "stat_metadata": stat_metadata,
         "report": ds_report,
         "figures": all_figures,
     }
+    return results
 
+def run_all_agents_stream(original_prompt: str, **kwargs):
+    """
+    Generator variant of run_all_agents for interactive front ends.
+
+    Runs the pipeline in a background thread and yields its progress
+    events (see run_all_agents) as they happen, ending with the "done"
+    event that carries the full result. Accepts the same keyword arguments
+    as run_all_agents; an exception in the pipeline is re-raised here.
+    """
+    events = queue.Queue()
+    finished = object()
+    failure = []
+
+    def work():
+        try:
+            run_all_agents(original_prompt, on_event=events.put, **kwargs)
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            events.put(finished)
+
+    worker = threading.Thread(target=work, daemon=True)
+    worker.start()
+    while True:
+        event = events.get()
+        if event is finished:
+            break
+        yield event
+    worker.join()
+    if failure:
+        raise failure[0]
+
+async def run_all_agents_async(
+    original_prompt: str,
+    metadata_text: str | None = None,
+    focus: str|None = None,
+    max_steps: int = 100,
+    verbose: bool = False,
+    OpenAI_API_key: str = None,
+    max_concurrency: int = MAX_PARALLEL_STEPS,
+    use_cache: bool = RESPONSE_CACHE_ENABLED,
+) -> dict:
+    """
+    Async variant of run_all_agents. All LLM calls share one AsyncOpenAI
+    client per event loop, and code execution runs in worker threads, so a
+    single event loop can serve many questions concurrently.
+    """
+    run_id = new_run_id()
+    try:
+        with run_context(run_id), span("question", **{"question": original_prompt, "run_id": run_id}):
+            results = await _run_pipeline_async(
+                original_prompt,
+                metadata_text=metadata_text,
+                focus=focus,
+                max_steps=max_steps,
+                verbose=verbose,
+                OpenAI_API_key=OpenAI_API_key,
+                max_concurrency=max_concurrency,
+                use_cache=use_cache,
+            )
+    finally:
+        report = _finish_run(run_id, verbose=verbose)
+    results["telemetry"] = report
     return results
 
+async def _run_pipeline_async(
+    original_prompt: str,
+    metadata_text: str | None,
+    focus: str | None,
+    max_steps: int,
+    verbose: bool,
+    OpenAI_API_key: str,
+    max_concurrency: int,
+    use_cache: bool,
+) -> dict:
+    if OpenAI_API_key is None:
+        OpenAI_API_key = os.getenv("OPENAI_API_KEY")
+
+    user_prompt = build_focus(original_question=original_prompt, focus= focus)
+    if metadata_text is None:
+        # Selected once per question: every agent call then shares this prefix
+        metadata_text = select_metadata(user_prompt)
+
+    orchestrator_output = await run_orchestrator_agent_async(
+        user_prompt=user_prompt,
+        metadata_text=metadata_text,
+        api_key=OpenAI_API_key,
+        use_cache=use_cache,
+    )
+
+    plan, clarification = _check_plan(orchestrator_output, max_steps, verbose=verbose)
+    if clarification is not None:
+        return clarification
+
+    shared_env = {}
+    shared_meta = {}
+
+    async def run_step(step):
+        return await run_plan_step_async(
+            step,
+            shared_env=shared_env,
+            shared_meta=shared_meta,
+            metadata_text=metadata_text,
+            verbose=verbose,
+            api_key=OpenAI_API_key,
+            use_cache=use_cache,
+        )
+
+    step_results = await schedule_plan_async(
+        plan, run_step,
+        on_step_done=_publish_step(shared_env, shared_meta),
+        max_concurrency=max_concurrency,
+    )
+    stat_df, stat_metadata, ds_report, all_figures = _collect_results(plan, step_results, shared_env, shared_meta)
+
+    summary_text = await run_summarize_agent_async(ds_report=ds_report, user_prompt=user_prompt, verbose = verbose, api_key=OpenAI_API_key, use_cache=use_cache)
+
+    return {
+        "summary": summary_text,
+        "stat_df": stat_df,
+        "stat_metadata": stat_metadata,
+        "report": ds_report,
+        "figures": all_figures,
+    }
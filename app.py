@@ -1,9 +1,12 @@
 import streamlit as st
 from stpages import verify_api_key, init_session_state, page_api_key, page_ask_agent
+from executor import warm_up
 
 def main():
     st.set_page_config(page_title="IRS SOI Migration Data Agent", layout="wide")
     init_session_state()
+    # Code-execution workers start loading while the user enters a key
+    warm_up()
 
     st.title("IRS SOI Migration Data Agent")
 
@@ -0,0 +1,111 @@
+"""
+Offline stand-in for the OpenAI client that replays a recorded scenario.
+
+A scenario fixture (benchmarks/fixtures/*.json) holds what the models
+answered for one question: the orchestrator plan, the DA / DS turns of
+every plan step (tool calls with their arguments, or a final answer) and
+the summary. ReplayClient recognises the calling agent by its system
+prompt and the plan step by the step prompt in the user message, and
+returns the next recorded turn as a real ChatCompletion, so everything
+downstream of the LLM (code execution, queries, figures, caching,
+telemetry) runs exactly as it does live.
+"""
+import json
+import time
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletion
+
+from metadata import estimate_tokens
+
+
+class ReplayError(RuntimeError):
+    """The pipeline asked for a turn the scenario has no recording for."""
+
+
+class _Completions:
+    def __init__(self, scenario: dict, latency: float):
+        import agents
+
+        self.scenario = scenario
+        self.latency = latency
+        self.prompts = {
+            agents.orchestrator_prompt: "orchestrator",
+            agents.da_agent_prompt: "da",
+            agents.ds_agent_prompt: "ds",
+            agents.summarize_prompt: "summarize",
+        }
+        self.calls = 0
+
+    def _step_turns(self, role: str, user_content: str) -> list:
+        for step in self.scenario["plan"]["plan"]:
+            prompt = step["da_prompt"] if role == "da" else step["ds_prompt"]
+            if prompt and prompt in user_content:
+                return self.scenario["steps"][str(step["step_id"])][role]
+        raise ReplayError(f"No recorded {role.upper()} step for prompt: {user_content[:120]!r}")
+
+    def _turn(self, messages: list) -> dict:
+        role = self.prompts.get(messages[0]["content"])
+        if role is None:
+            raise ReplayError("Unknown system prompt; was a prompt file changed?")
+        if role == "orchestrator":
+            return {"content": json.dumps(self.scenario["plan"])}
+        if role == "summarize":
+            return {"content": self.scenario["summary"]}
+
+        user_content = next(m["content"] for m in messages if m["role"] == "user")
+        turns = self._step_turns(role, user_content)
+        index = sum(1 for m in messages if m["role"] == "assistant")
+        if index >= len(turns):
+            raise ReplayError(f"{role.upper()} agent asked for turn {index + 1}; only {len(turns)} recorded.")
+        return turns[index]
+
+    def create(self, model: str, messages: list, **kwargs):
+        if kwargs.get("stream"):
+            raise ReplayError("Streamed calls are not replayed; run without on_event.")
+        turn = self._turn(messages)
+        if self.latency:
+            time.sleep(self.latency)
+
+        self.calls += 1
+        content = turn.get("content")
+        tool_calls = [
+            {
+                "id": f"call_{self.calls}_{i}",
+                "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])},
+            }
+            for i, call in enumerate(turn.get("tool_calls") or [])
+        ]
+        prompt_tokens = estimate_tokens(json.dumps(messages, default=str))
+        completion_tokens = estimate_tokens(content or json.dumps(tool_calls))
+        return ChatCompletion.model_validate({
+            "id": f"replay-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+                "message": {"role": "assistant", "content": content, "tool_calls": tool_calls or None},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0},
+            },
+        })
+
+
+class ReplayClient:
+    """
+    Drop-in for openai.OpenAI serving one scenario; `latency` seconds are
+    added to every call to simulate model response time.
+    """
+
+    def __init__(self, scenario: dict, latency: float = 0.0):
+        self.chat = SimpleNamespace(completions=_Completions(scenario, latency))
+
+    def close(self):
+        pass
@@ -0,0 +1,224 @@
+"""
+Offline benchmark of the ingestion and agent pipeline.
+
+Replays the recorded scenarios in benchmarks/fixtures through
+run_all_agents with a ReplayClient (no network, no API key) and times
+each phase separately:
+
+    ingestion_full         parse_all_data(incremental=False)
+    ingestion_incremental  parse_all_data() with nothing to rebuild
+    data_load              loading cached datasets (cold caches per run:
+                           the app's and fresh executor workers that
+                           preload nothing)
+    da_code                DA tool calls (Python, execute_query, run_sql)
+    ds_code                DS tool calls (the plotting code, including
+                           figure_render)
+    figure_render          rendering the figures the code created to
+                           image bytes (render_seconds of the tool results)
+    summarization          the summarize agent call
+    pipeline_total         run_all_agents wall time
+
+Tool phases are summed over plan steps, which run concurrently, so they
+can add up to more than pipeline_total.
+
+Each phase is the median over --repeat runs. Results are compared with
+benchmarks/baseline.json and phases slower than the baseline by more
+than --tolerance (and --min-seconds) are reported as regressions, with a
+non-zero exit code. Baselines are machine specific: record one with
+--update-baseline on the machine that runs the comparison.
+
+Run from the repository root:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --skip-ingestion --repeat 5
+    python -m benchmarks.run_benchmarks --update-baseline
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import clients
+import executor
+from agents import run_all_agents
+from data_parsing import parse_all_data
+from dataset_cache import DATASET_CACHE
+from figure_cache import FIGURE_CACHE
+from benchmarks.replay_client import ReplayClient
+
+BENCH_DIR = Path(__file__).resolve().parent
+FIXTURES_DIR = BENCH_DIR / "fixtures"
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+DEFAULT_REPEAT = 3
+# A phase regresses when it is this much slower than baseline, relatively and absolutely
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_MIN_SECONDS = 0.05
+
+
+def load_scenarios(names=None) -> list:
+    scenarios = [json.loads(p.read_text(encoding="utf-8")) for p in sorted(FIXTURES_DIR.glob("*.json"))]
+    if names:
+        scenarios = [s for s in scenarios if s["name"] in names]
+    return scenarios
+
+
+def time_ingestion() -> dict:
+    start = time.perf_counter()
+    parse_all_data(incremental=False)
+    full = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parse_all_data(incremental=True)
+    incremental = time.perf_counter() - start
+    return {"ingestion_full": full, "ingestion_incremental": incremental}
+
+
+def check_figures(figures: list):
+    for ref in figures:
+        if FIGURE_CACHE.get(ref) is None:
+            raise RuntimeError(f"Figure {ref.key[:12]} is missing from the figure cache.")
+
+
+def run_scenario(scenario: dict, latency: float = 0.0) -> dict:
+    """
+    One replay of a scenario with cold dataset caches. Returns seconds per phase.
+    """
+    DATASET_CACHE.clear()
+    # Workers that preload nothing, started before the clock so that process
+    # startup is not timed but every dataset load is
+    pool = executor.WorkerPool(preload=[])
+    pool.warm_up(wait=True)
+    previous_pool, executor.POOL = executor.POOL, pool
+    api_key = f"benchmark-{scenario['name']}"
+    factory = clients._sync_registry.factory
+    clients._sync_registry.factory = lambda key: ReplayClient(scenario, latency=latency)
+    try:
+        start = time.perf_counter()
+        results = run_all_agents(
+            original_prompt=scenario["question"],
+            focus=scenario.get("focus"),
+            OpenAI_API_key=api_key,
+            use_cache=False,
+        )
+        total = time.perf_counter() - start
+    finally:
+        clients.discard_client(api_key)
+        clients._sync_registry.factory = factory
+        executor.POOL = previous_pool
+        pool.shutdown()
+
+    if results.get("type") == "clarification" or results.get("summary") != scenario["summary"]:
+        raise RuntimeError(f"Scenario {scenario['name']} did not replay to its recorded summary.")
+    check_figures(results["figures"])
+
+    report = results["telemetry"]
+    agents = report["agents"]
+    return {
+        "data_load": report["data_load_seconds"],
+        "da_code": agents.get("DA agent", {}).get("tool_seconds", 0.0),
+        "ds_code": agents.get("DS agent", {}).get("tool_seconds", 0.0),
+        "figure_render": report["figure_render_seconds"],
+        "summarization": agents.get("Summarize agent", {}).get("llm_seconds", 0.0),
+        "pipeline_total": total,
+    }
+
+
+def median_phases(runs: list) -> dict:
+    return {phase: round(statistics.median(run[phase] for run in runs), 4) for phase in runs[0]}
+
+
+def run_benchmarks(scenarios: list, repeat: int = DEFAULT_REPEAT, latency: float = 0.0,
+                   ingestion: bool = True) -> dict:
+    """
+    Returns {"ingestion" or scenario name: {phase: median seconds}}.
+    """
+    results = {}
+    if ingestion:
+        results["ingestion"] = median_phases([time_ingestion() for _ in range(repeat)])
+    for scenario in scenarios:
+        results[scenario["name"]] = median_phases([run_scenario(scenario, latency) for _ in range(repeat)])
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE,
+            min_seconds: float = DEFAULT_MIN_SECONDS) -> list:
+    """
+    Rows of (group, phase, baseline, current, relative change, regressed).
+    Phases missing from the baseline are listed with baseline None.
+    """
+    rows = []
+    for group, phases in results.items():
+        for phase, current in phases.items():
+            base = baseline.get(group, {}).get(phase)
+            if base is None:
+                rows.append((group, phase, None, current, None, False))
+                continue
+            change = (current - base) / base if base else None
+            regressed = current > base * (1 + tolerance) and current - base > min_seconds
+            rows.append((group, phase, base, current, change, regressed))
+    return rows
+
+
+def format_report(rows: list) -> str:
+    lines = [f"{'group':<24} {'phase':<22} {'baseline':>9} {'current':>9} {'change':>8}"]
+    for group, phase, base, current, change, regressed in rows:
+        base_s = f"{base:.4f}" if base is not None else "-"
+        change_s = f"{change:+.0%}" if change is not None else "-"
+        flag = "  REGRESSION" if regressed else ""
+        lines.append(f"{group:<24} {phase:<22} {base_s:>9} {current:>9.4f} {change_s:>8}{flag}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the agent pipeline.")
+    parser.add_argument("--scenario", action="append", help="Only run these scenarios (repeatable).")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per phase; the median is reported.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per LLM call.")
+    parser.add_argument("--skip-ingestion", action="store_true", help="Do not time parse_all_data.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--min-seconds", type=float, default=DEFAULT_MIN_SECONDS)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--output", type=Path, help="Also write the results as JSON to this path.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        load_scenarios(args.scenario),
+        repeat=max(1, args.repeat),
+        latency=args.latency,
+        ingestion=not args.skip_ingestion,
+    )
+    record = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(record, indent=2) + "\n", encoding="utf-8")
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+    rows = compare(results, baseline, tolerance=args.tolerance, min_seconds=args.min_seconds)
+    print(format_report(rows))
+
+    if args.update_baseline:
+        # Keep baseline groups that were not run this time
+        record["results"] = {**baseline, **results}
+        args.baseline.write_text(json.dumps(record, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = [row for row in rows if row[5]]
+    if regressions:
+        print(f"\n{len(regressions)} phase(s) regressed beyond {args.tolerance:.0%}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Registry of reusable OpenAI clients, one per API key.
+
+Each client owns an HTTP connection pool; reusing it keeps connections
+alive across the many LLM calls of one question instead of paying a new
+TLS handshake per call.
+
+The registry never closes a client itself: another thread or plan step
+may still be in the middle of a request with it. Evicted or discarded
+clients are only forgotten, and their connections are released once the
+last holder lets go of them.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from openai import OpenAI, AsyncOpenAI
+
+from config import CLIENT_REGISTRY_MAX_SIZE, CLIENT_IDLE_TIMEOUT_SECONDS
+
+
+class ClientRegistry:
+    """
+    Bounded, thread-safe map api_key -> client.
+
+    The least recently used client is dropped once more than `max_size`
+    keys are registered, and clients unused for `idle_timeout` seconds are
+    dropped on the next lookup.
+    """
+
+    def __init__(self, factory, max_size: int = CLIENT_REGISTRY_MAX_SIZE,
+                 idle_timeout: float = CLIENT_IDLE_TIMEOUT_SECONDS):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._clients = OrderedDict()   # api_key -> (client, last_used)
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str):
+        now = time.monotonic()
+        with self._lock:
+            if api_key in self._clients:
+                client = self._clients.pop(api_key)[0]
+            else:
+                client = self.factory(api_key)
+            self._clients[api_key] = (client, now)
+
+            for key, (_, last_used) in list(self._clients.items()):
+                if key != api_key and now - last_used > self.idle_timeout:
+                    del self._clients[key]
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+        return client
+
+    def discard(self, api_key: str):
+        """
+        Forget the client for api_key (e.g. after its key was rejected).
+        """
+        with self._lock:
+            self._clients.pop(api_key, None)
+
+    def __len__(self):
+        return len(self._clients)
+
+
+_sync_registry = ClientRegistry(factory=lambda key: OpenAI(api_key=key))
+# AsyncOpenAI connection pools are bound to the event loop they first run on,
+# so async clients are registered per loop.
+_async_registries = weakref.WeakKeyDictionary()
+
+
+def get_client(api_key: str = None) -> OpenAI:
+    """
+    Shared synchronous OpenAI client for api_key (defaults to OPENAI_API_KEY).
+    """
+    if api_key is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+    return _sync_registry.get(api_key)
+
+
+def get_async_client(api_key: str = None) -> AsyncOpenAI:
+    """
+    Shared AsyncOpenAI client for api_key on the running event loop.
+    """
+    if api_key is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+    loop = asyncio.get_running_loop()
+    if loop not in _async_registries:
+        _async_registries[loop] = ClientRegistry(factory=lambda key: AsyncOpenAI(api_key=key))
+    return _async_registries[loop].get(api_key)
+
+
+def discard_client(api_key: str):
+    """
+    Drop the synchronous client for api_key from the registry.
+    """
+    _sync_registry.discard(api_key)
@@ -0,0 +1,178 @@
+"""
+Bounded tool results for the agent loops.
+
+Whatever a tool returns goes back to the model on the next LLM call, so a
+script that prints a large table makes every later round trip slower and
+more expensive. compact_tool_result turns a tool result into the message
+content the model sees, within TOOL_RESULT_TOKEN_BUDGET tokens:
+
+    - DataFrames and Series are replaced by a summary (shape, dtypes,
+      head / tail rows and describe() of the numeric columns);
+    - stdout, stderr, tracebacks, error messages and any other long text
+      field are cut in the middle, keeping their beginning and (mostly,
+      for tracebacks) their end;
+    - if the result is still too large, lists are shortened, then the
+      longest nested strings, and as a last resort the JSON text itself is
+      cut to the budget.
+
+The full result is left untouched for the caller (logs, tool_calls).
+"""
+import json
+
+import pandas as pd
+
+from config import TOOL_RESULT_TOKEN_BUDGET, TOOL_RESULT_PREVIEW_ROWS
+from helper import make_json_safe
+from metadata import estimate_tokens
+
+# Share of a text field's budget kept from its end (other string fields: half)
+_TAIL_SHARES = {"stdout": 0.5, "stderr": 0.5, "traceback": 0.8, "error": 0.3}
+# Every text field keeps at least this many tokens, whatever the rest costs
+_MIN_TEXT_TOKENS = 50
+# Tokens taken by truncate_text's "... [N characters omitted] ..." line
+_MARKER_TOKENS = 12
+# Lists up to this long are never shortened (e.g. a summary's [rows, columns])
+_MIN_LIST_ITEMS = 2
+# Columns shown in a DataFrame summary
+_MAX_COLUMNS = 30
+
+
+def _records(df: pd.DataFrame) -> list:
+    # to_json handles timestamps, NaN and numpy scalars
+    return json.loads(df.to_json(orient="records", date_format="iso", double_precision=6))
+
+
+def summarize_dataframe(df, rows: int = TOOL_RESULT_PREVIEW_ROWS) -> dict:
+    """
+    A JSON-friendly summary of a DataFrame (or Series) in place of its rows.
+    """
+    if isinstance(df, pd.Series):
+        df = df.to_frame(name=df.name if df.name is not None else "value")
+    shown = df.iloc[:, :_MAX_COLUMNS].set_axis([str(c) for c in df.columns[:_MAX_COLUMNS]], axis=1)
+
+    summary = {
+        "type": "DataFrame",
+        "shape": [int(df.shape[0]), int(df.shape[1])],
+        "dtypes": {column: str(dtype) for column, dtype in shown.dtypes.items()},
+        "head": _records(shown.head(rows)),
+    }
+    if df.shape[1] > _MAX_COLUMNS:
+        summary["columns_omitted"] = int(df.shape[1] - _MAX_COLUMNS)
+    if len(df) > rows:
+        summary["tail"] = _records(shown.iloc[max(rows, len(df) - rows):])
+    numeric = shown.select_dtypes("number")
+    if not numeric.empty:
+        summary["describe"] = json.loads(numeric.describe().to_json(double_precision=6))
+    return summary
+
+
+def truncate_text(text: str, max_tokens: int, tail_share: float = 0.5) -> str:
+    """
+    Cut `text` to about `max_tokens` tokens, keeping its beginning and end
+    (`tail_share` of the kept characters come from the end).
+    """
+    max_chars = max(0, max_tokens) * 4
+    if len(text) <= max_chars:
+        return text
+    tail = int(max_chars * tail_share)
+    head = max_chars - tail
+    omitted = len(text) - max_chars
+    return f"{text[:head]}\n... [{omitted} characters omitted] ...\n{text[len(text) - tail:]}"
+
+
+def _summarize(obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return summarize_dataframe(obj)
+    if isinstance(obj, dict):
+        return {k: _summarize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_summarize(v) for v in obj]
+    return obj
+
+
+def _dumps(payload) -> str:
+    return json.dumps(payload, default=str)
+
+
+def _shorten_lists(obj) -> bool:
+    """
+    Halve every list longer than one item (rows, values), in place.
+    Short fixed-size lists such as a summary's shape are left alone.
+    Returns whether anything changed.
+    """
+    changed = False
+    items = obj.values() if isinstance(obj, dict) else obj if isinstance(obj, list) else ()
+    for value in items:
+        changed = _shorten_lists(value) or changed
+    if isinstance(obj, list) and len(obj) > _MIN_LIST_ITEMS:
+        del obj[(len(obj) + 1) // 2:]
+        changed = True
+    return changed
+
+
+def _strings(obj):
+    """
+    (container, key) of every string nested in obj.
+    """
+    keys = obj.keys() if isinstance(obj, dict) else range(len(obj)) if isinstance(obj, list) else ()
+    for k in keys:
+        if isinstance(obj[k], str):
+            yield obj, k
+        else:
+            yield from _strings(obj[k])
+
+
+def _trim_longest_string(obj, over_tokens: int) -> bool:
+    """
+    Cut the longest string nested in obj by about `over_tokens`, in place.
+    Returns False once no string can be made shorter.
+    """
+    container, key = max(_strings(obj), key=lambda ck: len(ck[0][ck[1]]), default=(None, None))
+    if container is None:
+        return False
+    text = container[key]
+    cut = truncate_text(text, max(_MIN_TEXT_TOKENS, len(text) // 4 - over_tokens - _MARKER_TOKENS))
+    # Near _MIN_TEXT_TOKENS the omission marker costs more than it saves
+    if len(cut) >= len(text):
+        return False
+    container[key] = cut
+    return True
+
+
+def compact_tool_result(result: dict, token_budget: int = TOOL_RESULT_TOKEN_BUDGET) -> str:
+    """
+    JSON content for a tool message, within about `token_budget` tokens.
+    A "compacted" flag tells the model that parts of the result were cut.
+    Only a result that cannot be shrunk otherwise comes back as cut JSON text.
+    """
+    payload = make_json_safe(_summarize(result))
+    content = _dumps(payload)
+    if estimate_tokens(content) <= token_budget:
+        return content
+    payload["compacted"] = True
+
+    # Text first: split what the other fields leave between the text fields
+    texts = {field: value for field, value in payload.items() if isinstance(value, str) and value}
+    if texts:
+        rest = estimate_tokens(_dumps({k: v for k, v in payload.items() if k not in texts}))
+        available = token_budget - rest
+        # Short fields keep everything; the longest ones share the remainder
+        for i, field in enumerate(sorted(texts, key=lambda f: len(texts[f]))):
+            text = texts[field]
+            share = max(_MIN_TEXT_TOKENS, available // (len(texts) - i))
+            # Newlines and quotes grow when escaped: budget the JSON, not the
+            # raw text, and leave room for the omission marker
+            share = int(share * len(text) / len(_dumps(text))) - _MARKER_TOKENS
+            payload[field] = truncate_text(text, share, tail_share=_TAIL_SHARES.get(field, 0.5))
+            available -= estimate_tokens(_dumps(payload[field]))
+
+    content = _dumps(payload)
+    while estimate_tokens(content) > token_budget and _shorten_lists(payload):
+        content = _dumps(payload)
+    # Last resort, e.g. long strings nested in result_meta or escaping overhead
+    while (over := estimate_tokens(content) - token_budget) > 0 and _trim_longest_string(payload, over):
+        content = _dumps(payload)
+    # Hard cap: many short values can still add up past the budget
+    if estimate_tokens(content) > token_budget:
+        content = truncate_text(content, token_budget - _MARKER_TOKENS, tail_share=0.1)
+    return content
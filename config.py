@@ -3,3 +3,79 @@ gpt_model_adv = "gpt-5.1"
 
 OUTPUT_TOKEN_LIMIT = 2000
 
+# Worker processes for raw SOI ingestion (None = one per CPU, 1 = serial)
+PARSE_MAX_WORKERS = None
+
+# Memory budget for the process-wide dataset cache used by agent code execution
+DATASET_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Maximum number of orchestrator plan steps run concurrently
+MAX_PARALLEL_STEPS = 4
+
+# Shared OpenAI clients: at most this many API keys, dropped after this long unused
+CLIENT_REGISTRY_MAX_SIZE = 32
+CLIENT_IDLE_TIMEOUT_SECONDS = 15 * 60
+
+# Persistent cache of orchestrator plans, DA results and summaries
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_DIR = "cache/responses"
+RESPONSE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# run_sql tool: largest result table returned to the DA agent
+SQL_MAX_RESULT_ROWS = 100_000
+
+# execute_query tool: largest result table (e.g. of a plain row selection)
+QUERY_MAX_RESULT_ROWS = 100_000
+
+# Base year for the real (CPI-U adjusted) AGI columns of the derived metric tables
+CPI_BASE_YEAR = 2024
+
+# Metadata sent with a question is selected by relevance under this token budget
+METADATA_TOKEN_BUDGET = 4000
+
+# Send a prompt_cache_key with each LLM call so requests sharing a prompt prefix
+# are routed to the same provider-side cache
+PROMPT_CACHE_KEY_ENABLED = True
+
+# Per-call latency / token telemetry, buffered and appended to a CSV in batches
+TELEMETRY_ENABLED = True
+TELEMETRY_PATH = "logs/telemetry.csv"
+TELEMETRY_BATCH_SIZE = 50
+
+# OpenTelemetry spans per question: "file" (JSON lines at TRACING_PATH), "console" or "none"
+TRACING_ENABLED = True
+TRACING_EXPORTER = "file"
+TRACING_PATH = "logs/traces.jsonl"
+
+# Where execute_python_code runs generated code: "process" (warm worker pool, see
+# executor.py) or "inline" (in the calling process)
+EXECUTION_MODE = "process"
+EXECUTOR_WORKERS = 2
+# Workers are replaced after this many tasks, releasing whatever memory user code leaked
+EXECUTOR_MAX_TASKS_PER_WORKER = 50
+# Datasets every worker loads at startup
+EXECUTOR_PRELOAD_DATASETS = ["soi_panel", "soi_metrics", "soi_rollups", "state_flows", "cpi_u", "statefips_dict"]
+
+# Limits for generated code. Wall clock, CPU time and memory are enforced in the
+# worker processes only (EXECUTION_MODE = "process"); output and result_df caps always apply.
+EXECUTION_TIMEOUT_SECONDS = 60
+EXECUTION_CPU_SECONDS = 60
+# Resident memory of a worker process
+EXECUTION_MAX_MEMORY_MB = 2048
+# Printed output kept per stream; the rest is dropped and marked as truncated
+EXECUTION_MAX_OUTPUT_CHARS = 20_000
+EXECUTION_MAX_RESULT_ROWS = 100_000
+EXECUTION_MAX_RESULT_MB = 256
+
+# Figures are rendered inside the executor right after each tool call: "png",
+# "webp" or "svg", at this DPI for the raster formats
+FIGURE_FORMAT = "png"
+FIGURE_DPI = 100
+# Total size of the in-memory figure image cache; least recently shown figures go first
+FIGURE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Tool results sent back to the model are compacted to about this many tokens
+# (see compaction.py); DataFrames in a result are shown as this many head/tail rows
+TOOL_RESULT_TOKEN_BUDGET = 2_000
+TOOL_RESULT_PREVIEW_ROWS = 5
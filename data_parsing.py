@@ -1,10 +1,59 @@
 import pandas as pd
+import hashlib
+import json
+import os
 import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from config import PARSE_MAX_WORKERS
+
 # Directory where all your raw SOI CSVs are stored
 DATA_DIR = Path("data/raw")
 
+# Processed outputs: the flat CSV and the year-partitioned Parquet dataset
+PROCESSED_DIR = Path("data/processed")
+PANEL_CSV_PATH = PROCESSED_DIR / "soi_migration_long.csv"
+PANEL_PARQUET_DIR = PROCESSED_DIR / "soi_migration_long"
+# Derived tables built from the panel partitions (see derived_tables.py)
+METRICS_PARQUET_DIR = PROCESSED_DIR / "soi_metrics"
+ROLLUPS_PARQUET_DIR = PROCESSED_DIR / "soi_rollups"
+
+# Compact dtypes for the Parquet panel; `year` is stored as the hive partition key
+PANEL_DTYPES = {
+    "statefips": "int8",
+    "state": "category",
+    "state_name": "category",
+    "agi_stub": "int8",
+    "class": "category",
+    "age_class": "int8",
+}
+YEAR_PARTITIONING = ds.partitioning(pa.schema([("year", pa.int16())]), flavor="hive")
+
+# Rebuild manifest: one entry per raw file that feeds a processed partition.
+# Bump a family's parser version whenever its parsed output changes, so the
+# next incremental rebuild re-parses exactly the files of that family.
+MANIFEST_PATH = PROCESSED_DIR / "manifest.json"
+PARSER_VERSIONS = {
+    "inmigall": 1,
+    "stateinflow": 1,
+    "countyinflow": 1,
+}
+
+# Origin-destination flow store. Each level is written twice, sorted by
+# destination and by origin, so a lookup on either side only reads the
+# matching row groups of the requested year partitions.
+REFERENCE_DIR = Path("data/reference")
+FLOWS_DIR = PROCESSED_DIR / "flows"
+FLOW_LAYOUTS = ("by_destination", "by_origin")
+FLOW_ROW_GROUP_SIZE = {"state": 256, "county": 4096}
+
 def extract_year_from_filename(fname):
     """
     Example: 1112inmigall.csv → second year = 12 → 2012
@@ -29,63 +78,553 @@ def parse_raw_column(colname):
     age_class = int(m.group(3))
     return prefix, metric, age_class
 
+ID_COLS = ["statefips", "state", "state_name", "agi_stub"]
+METRIC_COLS = ["n1", "n2", "y1_agi", "y2_agi"]
+
+def build_column_lookup(columns):
+    """
+    Parse each distinct wide column header once.
+
+    Returns a DataFrame indexed by raw column name with columns
+    (class, metric, age_class). Headers that do not follow the
+    <class>_<metric>_<age_class> pattern are dropped.
+    """
+    parsed = {c: parse_raw_column(c) for c in columns}
+    lookup = pd.DataFrame.from_dict(
+        parsed, orient="index", columns=["class", "metric", "age_class"]
+    )
+    return lookup.dropna(subset=["class"]).astype({"age_class": "int64"})
+
 def parse_soi_file(path):
     """
     Parse a single SOI inmigall CSV into a tidy long format
     with metrics as separate columns.
+
+    Column headers are parsed once into a (class, age_class, metric)
+    MultiIndex, and the wide block is reshaped with a single stack
+    instead of melting every cell.
     """
     df = pd.read_csv(path)
     year = extract_year_from_filename(path.name)
 
-    id_cols = ["statefips", "state", "state_name", "agi_stub"]
-    value_cols = [c for c in df.columns if c not in id_cols]
+    value_cols = [c for c in df.columns if c not in ID_COLS]
+    lookup = build_column_lookup(value_cols)
 
-    # Melt to long form first
-    long_df = df.melt(
-        id_vars=id_cols,
-        value_vars=value_cols,
-        var_name="raw",
-        value_name="value"
-    )
+    wide = df.set_index(ID_COLS)[lookup.index]
+    wide.columns = pd.MultiIndex.from_frame(lookup[["class", "age_class", "metric"]])
 
-    # Parse each column name
-    long_df[["class", "metric", "age_class"]] = long_df["raw"].apply(
-        lambda x: pd.Series(parse_raw_column(x))
-    )
+    # Sum any duplicated headers so the result matches one row per key
+    if wide.columns.duplicated().any():
+        wide = wide.T.groupby(level=["class", "age_class", "metric"]).sum().T
 
-    # Now pivot so metric becomes wide: n1, n2, y1_agi, y2_agi
-    wide_df = long_df.pivot_table(
-        index=["statefips", "state", "state_name", "agi_stub", "class", "age_class"],
-        columns="metric",
-        values="value",
-        aggfunc="sum"   # safe since there is no duplication
-    ).reset_index()
+    # Move class/age_class into the rows; metric stays wide: n1, n2, y1_agi, y2_agi
+    wide_df = (
+        wide.stack(level=["class", "age_class"], future_stack=True)
+        .dropna(how="all")
+        .sort_index()
+        .reset_index()
+    )
 
     # Insert year column
     wide_df["year"] = year
 
     # Reorder columns
-    metric_cols = ["n1", "n2", "y1_agi", "y2_agi"]
     final_cols = ["year", "statefips", "state", "state_name",
-                  "agi_stub", "class", "age_class"] + metric_cols
+                  "agi_stub", "class", "age_class"] + METRIC_COLS
 
     # Ensure missing metric columns are filled with NaN
-    for m in metric_cols:
+    for m in METRIC_COLS:
         if m not in wide_df:
             wide_df[m] = pd.NA
 
     wide_df = wide_df[final_cols]
+    wide_df.columns.name = "metric"
 
     return wide_df
 
-def soi_long_parse_all_years():
-    all_files = sorted(DATA_DIR.glob("*inmigall*.csv"))
-    frames = []
-    for f in all_files:
-        print(f"Parsing {f.name} ...")
-        frames.append(parse_soi_file(f))
+def _resolve_workers(max_workers, n_tasks):
+    """
+    Number of worker processes to use for n_tasks files.
+    None means one per CPU; anything below 2 means serial.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    return max(1, min(int(max_workers), n_tasks))
+
+def parse_files(parser, paths, max_workers=PARSE_MAX_WORKERS, verbose=True):
+    """
+    Apply `parser` to every path, concurrently in a process pool when
+    more than one worker is available.
+
+    Results are returned in the same order as `paths`, regardless of
+    which worker finishes first. If the pool cannot be started (e.g. in
+    a sandbox without multiprocessing support) parsing falls back to a
+    serial loop.
+    """
+    paths = list(paths)
+    workers = _resolve_workers(max_workers, len(paths))
+
+    if verbose:
+        for f in paths:
+            print(f"Parsing {f.name} ...")
+
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(parser, paths))
+        except (BrokenProcessPool, OSError, NotImplementedError) as e:
+            if verbose:
+                print(f"Process pool unavailable ({e}); parsing serially.")
+
+    return [parser(f) for f in paths]
+
+def list_raw_files(pattern):
+    """
+    Raw files in DATA_DIR matching `pattern`, in year order.
+    """
+    return sorted(
+        DATA_DIR.glob(pattern),
+        key=lambda f: (extract_year_from_filename(f.name), f.name),
+    )
+
+def soi_long_parse_all_years(max_workers=PARSE_MAX_WORKERS):
+    all_files = list_raw_files("*inmigall*.csv")
+    frames = parse_files(parse_soi_file, all_files, max_workers=max_workers)
     return pd.concat(frames, ignore_index=True)
 
-def parse_all_data():
-    soi_long = soi_long_parse_all_years()
-    soi_long.to_csv("data/processed/soi_migration_long.csv", index=False)
+def write_year_partition(df, root, year, row_group_size=None):
+    """
+    Write one year of a table to <root>/year=<year>/part-0.parquet,
+    replacing any existing partition for that year atomically.
+    """
+    part_dir = Path(root) / f"year={int(year)}"
+    part_dir.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df.drop(columns="year"), preserve_index=False)
+
+    tmp_path = part_dir / "part-0.parquet.tmp"
+    pq.write_table(table, tmp_path, row_group_size=row_group_size)
+    os.replace(tmp_path, part_dir / "part-0.parquet")
+
+def write_panel_parquet(soi_long, root=PANEL_PARQUET_DIR):
+    """
+    Write the long SOI panel as a typed, year-partitioned Parquet dataset.
+    """
+    typed = soi_long.astype(PANEL_DTYPES)
+    for year, part in typed.groupby("year"):
+        write_year_partition(part, root, year)
+
+def read_year_partitioned(root, columns=None, filter=None):
+    """
+    Scan a year-partitioned Parquet dataset, reading only the requested
+    columns and the row groups / partitions that can match `filter`.
+    """
+    dataset = ds.dataset(root, format="parquet", partitioning=YEAR_PARTITIONING)
+    if columns is None:
+        # Put the partition key first, matching the CSV layout
+        columns = ["year"] + [c for c in dataset.schema.names if c != "year"]
+    return dataset.to_table(columns=list(columns), filter=filter).to_pandas()
+
+def load_soi_panel(columns=None, years=None, states=None, root=PANEL_PARQUET_DIR):
+    """
+    Load the processed SOI panel from Parquet.
+
+    Args:
+        columns: optional list of columns to read (column projection).
+        years: optional iterable of years; only those partitions are scanned.
+        states: optional iterable of 2-letter state abbreviations.
+        root: dataset directory (defaults to data/processed/soi_migration_long).
+
+    Returns:
+        pd.DataFrame with categorical class/state columns and small-int keys.
+    """
+    filter = None
+    if years is not None:
+        filter = ds.field("year").isin([int(y) for y in years])
+    if states is not None:
+        state_filter = ds.field("state").isin(list(states))
+        filter = state_filter if filter is None else filter & state_filter
+    return read_year_partitioned(root, columns=columns, filter=filter)
+
+# ---------------------------------------------------------------------------
+# Origin-destination flows (stateinflow / countyinflow)
+# ---------------------------------------------------------------------------
+
+# Summary origin codes used by SOI in place of a real origin state/county
+STATE_FLOW_CODES = {
+    96: "total_us_foreign",
+    97: "total_us",
+    98: "total_foreign",
+    57: "foreign",
+    72: "foreign",
+}
+COUNTY_FLOW_CODES = {
+    (96, 0): "total_us_foreign",
+    (97, 0): "total_us",
+    (97, 1): "total_same_state",
+    (97, 3): "total_different_state",
+    (98, 0): "total_foreign",
+}
+COUNTY_FLOW_STATE_CODES = {
+    57: "foreign",
+    58: "other_same_state",
+    59: "other_different_state",
+}
+FLOW_DTYPES = {
+    "dest_statefips": "int8",
+    "dest_state": "category",
+    "orig_statefips": "int8",
+    "orig_state": "category",
+    "orig_name": "category",
+    "flow_type": "category",
+    "n1": "Int64",
+    "n2": "Int64",
+    "agi": "Int64",
+}
+
+def load_state_abbrevs():
+    """
+    Mapping statefips -> 2-letter abbreviation from the reference table.
+    """
+    ref = pd.read_csv(REFERENCE_DIR / "statefips_dict.csv")
+    return dict(zip(ref["statefips"].astype(int), ref["state"]))
+
+def _normalize_flow_values(df):
+    """
+    Lower-case the value columns and turn SOI's -1 suppression marker into NA.
+    """
+    df = df.rename(columns={"AGI": "agi"})
+    for col in ["n1", "n2", "agi"]:
+        df[col] = pd.to_numeric(df[col]).astype("Int64").mask(lambda v: v < 0)
+    return df
+
+def _clean_summary_name(names):
+    # "CA Total Migration US" / "Autauga County Total Migration-US" -> "Total Migration-US"
+    return (
+        names.str.extract(r"(Total Migration.*|Non-migrants|Foreign.*|Other flows.*)$")[0]
+        .str.replace("Total Migration ", "Total Migration-", regex=False)
+        .fillna(names)
+    )
+
+def parse_state_flow_file(path):
+    """
+    Parse a stateinflow CSV into a typed origin -> destination table.
+
+    Summary rows (96/97/98 totals, 57 foreign) and the non-migrant row are
+    kept but labelled in `flow_type`; only rows with flow_type == "state"
+    are real state-to-state flows.
+    """
+    df = pd.read_csv(path, dtype={"y1_state": str, "y1_state_name": str})
+    df = _normalize_flow_values(df)
+    year = extract_year_from_filename(path.name)
+    abbrevs = load_state_abbrevs()
+
+    dest = df["y2_statefips"].astype(int)
+    orig = df["y1_statefips"].astype(int)
+
+    flow_type = orig.map(STATE_FLOW_CODES)
+    # From 2013-14 on, intrastate movers are reported as a second 97 row
+    same_state = (orig == 97) & df["y1_state_name"].str.contains("Same State", na=False)
+    flow_type = flow_type.mask(same_state, "total_same_state")
+    flow_type = flow_type.mask(flow_type.isna() & (orig == dest), "nonmigrant")
+    flow_type = flow_type.fillna("state")
+    is_summary = flow_type != "state"
+
+    out = pd.DataFrame({
+        "year": year,
+        "dest_statefips": dest,
+        "dest_state": dest.map(abbrevs),
+        "orig_statefips": orig,
+        "orig_state": df["y1_state"].where(~is_summary),
+        "orig_name": df["y1_state_name"].where(~is_summary, _clean_summary_name(df["y1_state_name"])),
+        "flow_type": flow_type,
+        "n1": df["n1"],
+        "n2": df["n2"],
+        "agi": df["agi"],
+    })
+    return out.astype(FLOW_DTYPES)
+
+def parse_county_flow_file(path):
+    """
+    Parse a countyinflow CSV into a typed origin -> destination table.
+
+    Destination county 000 rows are state totals. Summary origins
+    (96/97/98 totals, 57 foreign, 58/59 other flows) and non-migrant rows
+    are labelled in `flow_type`; county-to-county flows are "county".
+    """
+    df = pd.read_csv(path, dtype={"y1_state": str, "y1_countyname": str})
+    df = _normalize_flow_values(df)
+    year = extract_year_from_filename(path.name)
+    abbrevs = load_state_abbrevs()
+
+    dest_st = df["y2_statefips"].astype(int)
+    dest_co = df["y2_countyfips"].astype(int)
+    orig_st = df["y1_statefips"].astype(int)
+    orig_co = df["y1_countyfips"].astype(int)
+
+    codes = pd.Series(list(zip(orig_st, orig_co)), index=df.index)
+    flow_type = codes.map(COUNTY_FLOW_CODES)
+    flow_type = flow_type.fillna(orig_st.map(COUNTY_FLOW_STATE_CODES))
+    is_nonmig = flow_type.isna() & (orig_st == dest_st) & (orig_co == dest_co)
+    flow_type = flow_type.mask(is_nonmig, "nonmigrant").fillna("county")
+    is_summary = flow_type != "county"
+
+    out = pd.DataFrame({
+        "year": year,
+        "dest_statefips": dest_st,
+        "dest_countyfips": dest_co.astype("int16"),
+        "dest_state": dest_st.map(abbrevs),
+        "orig_statefips": orig_st,
+        "orig_countyfips": orig_co.astype("int16"),
+        "orig_state": df["y1_state"].where(~is_summary),
+        "orig_name": df["y1_countyname"].where(~is_summary, _clean_summary_name(df["y1_countyname"])),
+        "flow_type": flow_type,
+        "n1": df["n1"],
+        "n2": df["n2"],
+        "agi": df["agi"],
+    })
+    return out.astype(FLOW_DTYPES)
+
+def flow_roots(level):
+    """
+    Dataset directories of one flow level, one per sort layout.
+    """
+    return [FLOWS_DIR / level / layout for layout in FLOW_LAYOUTS]
+
+def write_flow_parquet(flows, level):
+    """
+    Write a flow table twice per year: sorted by destination and by origin.
+    """
+    dest_keys = ["dest_statefips", "orig_statefips"]
+    orig_keys = ["orig_statefips", "dest_statefips"]
+    if level == "county":
+        dest_keys = ["dest_statefips", "dest_countyfips", "orig_statefips", "orig_countyfips"]
+        orig_keys = ["orig_statefips", "orig_countyfips", "dest_statefips", "dest_countyfips"]
+
+    dest_root, orig_root = flow_roots(level)
+    row_group_size = FLOW_ROW_GROUP_SIZE[level]
+    for year, part in flows.groupby("year"):
+        write_year_partition(part.sort_values(dest_keys), dest_root, year, row_group_size)
+        write_year_partition(part.sort_values(orig_keys), orig_root, year, row_group_size)
+
+def write_state_flow_parquet(flows):
+    write_flow_parquet(flows, "state")
+
+def write_county_flow_parquet(flows):
+    write_flow_parquet(flows, "county")
+
+def _place_filter(prefix, places, abbrevs):
+    """
+    Build a dataset filter for a list of places. Each place is a state
+    abbreviation, a state FIPS code, or a (statefips, countyfips) tuple.
+    """
+    fips_by_abbrev = {v: k for k, v in abbrevs.items()}
+    expr = None
+    for place in places:
+        if isinstance(place, tuple):
+            st, co = place
+            cond = (ds.field(f"{prefix}_statefips") == int(st)) & (ds.field(f"{prefix}_countyfips") == int(co))
+        else:
+            st = fips_by_abbrev[place] if isinstance(place, str) else int(place)
+            cond = ds.field(f"{prefix}_statefips") == st
+        expr = cond if expr is None else expr | cond
+    return expr
+
+def load_flows(level="state", years=None, destinations=None, origins=None, columns=None, flow_types=None):
+    """
+    Load origin -> destination migration flows from the flow store.
+
+    Args:
+        level: "state" or "county".
+        years: optional iterable of years; only those partitions are scanned.
+        destinations / origins: optional lists of places, each a state
+            abbreviation ("TX"), state FIPS (48) or (statefips, countyfips) tuple.
+        columns: optional list of columns to read.
+        flow_types: optional list of flow_type values, e.g. ["state"] to
+            drop summary and non-migrant rows.
+
+    Returns:
+        pd.DataFrame of matching flows.
+    """
+    dest_root, orig_root = flow_roots(level)
+    # Read from the layout sorted on the side being looked up
+    root = orig_root if origins is not None and destinations is None else dest_root
+    abbrevs = load_state_abbrevs()
+
+    filters = []
+    if years is not None:
+        filters.append(ds.field("year").isin([int(y) for y in years]))
+    if destinations is not None:
+        filters.append(_place_filter("dest", destinations, abbrevs))
+    if origins is not None:
+        filters.append(_place_filter("orig", origins, abbrevs))
+    if flow_types is not None:
+        filters.append(ds.field("flow_type").isin(list(flow_types)))
+
+    filter = None
+    for f in filters:
+        filter = f if filter is None else filter & f
+    return read_year_partitioned(root, columns=columns, filter=filter)
+
+def file_fingerprint(path):
+    """
+    Size, mtime and SHA-256 content hash of a raw file.
+    """
+    stat = path.stat()
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest.hexdigest(),
+    }
+
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Load the rebuild manifest ({raw file path: entry}); empty if missing.
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+def plan_rebuild(family, raw_files, output_root, manifest):
+    """
+    Decide which raw files of one family need (re)parsing.
+
+    A file is reused when its manifest entry has the current parser
+    version, its output partition still exists, and either size+mtime
+    match or (after a touch) the content hash still matches.
+
+    Returns:
+        (stale, entries, removed)
+            stale: list of raw files to parse
+            entries: {path: manifest entry} for every current raw file
+            removed: manifest entries of this family whose raw file is gone
+    """
+    version = PARSER_VERSIONS[family]
+    stale = []
+    entries = {}
+
+    for f in raw_files:
+        key = f.as_posix()
+        year = extract_year_from_filename(f.name)
+        old = manifest.get(key)
+        partition = Path(output_root) / f"year={year}"
+
+        reusable = (
+            old is not None
+            and old.get("family") == family
+            and old.get("parser_version") == version
+            and partition.exists()
+        )
+        stat = f.stat()
+        if reusable and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+            entries[key] = old
+            continue
+
+        fingerprint = file_fingerprint(f)
+        entries[key] = {
+            "family": family,
+            "year": year,
+            "parser_version": version,
+            "output": Path(output_root).as_posix(),
+            **fingerprint,
+        }
+        if not (reusable and old["sha256"] == fingerprint["sha256"]):
+            stale.append(f)
+
+    removed = [
+        entry for key, entry in manifest.items()
+        if entry.get("family") == family and key not in entries
+    ]
+    return stale, entries, removed
+
+def drop_year_partition(root, year):
+    part_dir = Path(root) / f"year={int(year)}"
+    if part_dir.exists():
+        shutil.rmtree(part_dir)
+
+def rebuild_family(family, pattern, parser, writer, roots, manifest, max_workers=PARSE_MAX_WORKERS):
+    """
+    Incrementally rebuild the processed output of one raw-file family.
+
+    Returns:
+        (changed_years, entries) where entries are the family's new
+        manifest entries.
+    """
+    raw_files = list_raw_files(pattern)
+    stale, entries, removed = plan_rebuild(family, raw_files, roots[0], manifest)
+
+    # A renamed file keeps its year: only drop years no current file covers
+    current_years = {entry["year"] for entry in entries.values()}
+    for entry in removed:
+        if entry["year"] not in current_years:
+            for root in roots:
+                drop_year_partition(root, entry["year"])
+
+    frames = parse_files(parser, stale, max_workers=max_workers)
+    for frame in frames:
+        writer(frame)
+
+    changed_years = sorted(
+        {extract_year_from_filename(f.name) for f in stale}
+        | {entry["year"] for entry in removed}
+    )
+    return changed_years, entries
+
+# family -> (raw file pattern, parser, partition writer, output roots)
+RAW_FAMILIES = {
+    "inmigall": ("*inmigall*.csv", parse_soi_file, write_panel_parquet, [PANEL_PARQUET_DIR]),
+    "stateinflow": ("*stateinflow*.csv", parse_state_flow_file, write_state_flow_parquet, flow_roots("state")),
+    "countyinflow": ("*countyinflow*.csv", parse_county_flow_file, write_county_flow_parquet, flow_roots("county")),
+}
+
+def parse_all_data(max_workers=PARSE_MAX_WORKERS, incremental=True):
+    """
+    Rebuild all processed SOI outputs: the inmigall panel (Parquet + CSV),
+    the state/county flow stores and the derived tables built from the panel.
+
+    With incremental=True only raw files that are new, changed, or parsed
+    by an older parser version are parsed; their year partitions are
+    replaced and all other partitions are left untouched. With
+    incremental=False the processed roots are cleared and rebuilt.
+
+    Returns:
+        {family or derived table: sorted list of years whose partitions
+        were written or removed}
+    """
+    manifest = load_manifest() if incremental else {}
+    changed = {}
+
+    for family, (pattern, parser, writer, roots) in RAW_FAMILIES.items():
+        if not incremental:
+            # Start from empty roots so no partition of a vanished raw file survives
+            for root in roots:
+                shutil.rmtree(root, ignore_errors=True)
+        changed[family], entries = rebuild_family(
+            family, pattern, parser, writer, roots, manifest, max_workers=max_workers
+        )
+        manifest = {k: v for k, v in manifest.items() if v.get("family") != family}
+        manifest.update(entries)
+
+    # The flat CSV is regenerated from the partitions, which is cheap
+    if changed["inmigall"] or not PANEL_CSV_PATH.exists():
+        soi_long = load_soi_panel().sort_values("year", kind="stable")
+        soi_long.to_csv(PANEL_CSV_PATH, index=False)
+
+    # Derived tables are built from the panel partitions written above
+    from derived_tables import refresh_derived_tables
+    changed.update(refresh_derived_tables(changed["inmigall"], manifest))
+
+    save_manifest(manifest)
+
+    return changed
@@ -0,0 +1,135 @@
+"""
+Process-wide, read-only cache of the processed and reference datasets.
+
+Agent code executions reference these tables by name (e.g. `soi_panel`);
+each one is loaded at most once per process and per on-disk version, and
+handed to the execution namespace as a private copy.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+from config import DATASET_CACHE_MAX_BYTES
+from telemetry import TELEMETRY
+from data_parsing import (
+    PANEL_PARQUET_DIR,
+    METRICS_PARQUET_DIR,
+    ROLLUPS_PARQUET_DIR,
+    FLOWS_DIR,
+    REFERENCE_DIR,
+    load_soi_panel,
+    load_flows,
+)
+
+
+def read_reference_csv(path):
+    """
+    Read a reference CSV with lower-case column names (CPI_U.csv ships `Year`).
+    """
+    df = pd.read_csv(path)
+    df.columns = [c.lower() for c in df.columns]
+    return df
+
+
+# name -> (path whose mtime versions the data, loader)
+DATASETS = {
+    "soi_panel": (PANEL_PARQUET_DIR, load_soi_panel),
+    "soi_metrics": (METRICS_PARQUET_DIR, lambda: load_soi_panel(root=METRICS_PARQUET_DIR)),
+    "soi_rollups": (ROLLUPS_PARQUET_DIR, lambda: load_soi_panel(root=ROLLUPS_PARQUET_DIR)),
+    "state_flows": (FLOWS_DIR / "state", lambda: load_flows("state")),
+    "county_flows": (FLOWS_DIR / "county", lambda: load_flows("county")),
+    "cpi_u": (REFERENCE_DIR / "CPI_U.csv", lambda: read_reference_csv(REFERENCE_DIR / "CPI_U.csv")),
+    "statefips_dict": (REFERENCE_DIR / "statefips_dict.csv", lambda: read_reference_csv(REFERENCE_DIR / "statefips_dict.csv")),
+}
+
+
+def path_mtime(path) -> int:
+    """
+    Latest mtime (ns) of a file, or of any file below a directory.
+    Partition rewrites deep inside a dataset therefore change the key.
+    """
+    path = Path(path)
+    if not path.is_dir():
+        return path.stat().st_mtime_ns
+    latest = path.stat().st_mtime_ns
+    for root, _, files in os.walk(path):
+        for f in files:
+            latest = max(latest, os.stat(os.path.join(root, f)).st_mtime_ns)
+    return latest
+
+
+class DatasetCache:
+    """
+    LRU cache of DataFrames keyed by (name, path, mtime), bounded by the
+    total in-memory size of the cached frames.
+    """
+
+    def __init__(self, datasets: dict = DATASETS, max_bytes: int = DATASET_CACHE_MAX_BYTES):
+        self.datasets = datasets
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (DataFrame, nbytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in datasets}
+
+    def get(self, name: str) -> pd.DataFrame:
+        """
+        Return the cached DataFrame for `name`, loading it if it is missing
+        or the files on disk changed. Callers must not mutate the result.
+        """
+        path, loader = self.datasets[name]
+        key = (name, str(path), path_mtime(path))
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+
+        # Only one thread loads a given dataset; others wait and then hit the cache
+        with self._load_locks[name]:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
+
+            start = time.perf_counter()
+            df = loader()
+            TELEMETRY.record("data_load", time.perf_counter() - start, name=name, success=True)
+            nbytes = int(df.memory_usage(deep=True).sum())
+
+            with self._lock:
+                # Drop stale versions of this dataset, then evict LRU entries
+                for old_key in [k for k in self._entries if k[0] == name]:
+                    self._total_bytes -= self._entries.pop(old_key)[1]
+                self._entries[key] = (df, nbytes)
+                self._total_bytes += nbytes
+                while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                    _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                    self._total_bytes -= evicted_bytes
+            return df
+
+    def namespace(self, code: str = "", env: dict | None = None) -> dict:
+        """
+        Copies of the datasets referenced by name in `code` that are not
+        already defined in `env`, ready to merge into an exec namespace.
+        """
+        env = env or {}
+        out = {}
+        for name in self.datasets:
+            if name in env or not re.search(rf"\b{name}\b", code):
+                continue
+            out[name] = self.get(name).copy()
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+DATASET_CACHE = DatasetCache()
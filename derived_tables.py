@@ -0,0 +1,203 @@
+"""
+Tables derived from the processed SOI panel.
+
+`soi_metrics` holds one row per (year, state, agi_stub, age_class) with
+the five classes pivoted into columns and the standard metrics of
+data/metadata/soi_derived_metrics.md precomputed: migration rates on n1
+and n2, net counts, AGI shares, net FAGI and CPI-U adjusted AGI.
+`soi_rollups` holds the same columns for Census regions, divisions and
+the nation, with counts and AGI summed over member states and the rates
+recomputed from those sums.
+
+Derived tables are year-partitioned like the panel and are refreshed by
+parse_all_data() for the years whose panel partitions changed; a change
+to a reference input (e.g. CPI_U.csv) or to a table's version rebuilds
+every year of that table.
+"""
+import hashlib
+from pathlib import Path
+
+import pandas as pd
+
+from config import CPI_BASE_YEAR
+from data_parsing import (
+    PANEL_PARQUET_DIR,
+    METRICS_PARQUET_DIR,
+    ROLLUPS_PARQUET_DIR,
+    REFERENCE_DIR,
+    METRIC_COLS,
+    load_soi_panel,
+    write_year_partition,
+    drop_year_partition,
+    file_fingerprint,
+)
+from dataset_cache import read_reference_csv
+
+CPI_PATH = REFERENCE_DIR / "CPI_U.csv"
+STATEFIPS_PATH = REFERENCE_DIR / "statefips_dict.csv"
+METRIC_KEYS = ["year", "statefips", "state", "state_name", "agi_stub", "age_class"]
+ROLLUP_KEYS = ["year", "geo_level", "geo_name", "agi_stub", "age_class"]
+# Rollup level -> statefips_dict column naming each state's group
+ROLLUP_LEVELS = {"region": "region", "division": "division", "national": None}
+CLASSES = ["inflow", "outflow", "total", "nonmig", "samest"]
+
+
+def _ratio(num, den):
+    # Rates over an empty base are missing, not inf
+    return num / den.where(den != 0)
+
+
+def pivot_classes(panel, keys):
+    """
+    One row per `keys` combination with a `<class>_<metric>` column for
+    every class and metric (e.g. inflow_n1, total_y2_agi).
+    """
+    wide = panel.set_index(keys + ["class"])[METRIC_COLS].unstack("class")
+    wide.columns = [f"{cls}_{metric}" for metric, cls in wide.columns]
+    wide = wide[[f"{cls}_{metric}" for cls in CLASSES for metric in METRIC_COLS]]
+    return wide.reset_index()
+
+
+def add_rate_columns(wide):
+    """
+    Add the default derived metrics, computed from the class count and AGI
+    columns of `wide` (rates are always ratios of sums, never averages).
+    """
+    wide["net_n1"] = wide["inflow_n1"] - wide["outflow_n1"]
+    wide["inflow_rate"] = _ratio(wide["inflow_n1"], wide["total_n1"])
+    wide["outflow_rate"] = _ratio(wide["outflow_n1"], wide["total_n1"])
+    wide["net_migration_rate"] = _ratio(wide["net_n1"], wide["total_n1"])
+
+    wide["net_n2"] = wide["inflow_n2"] - wide["outflow_n2"]
+    wide["inflow_rate_n2"] = _ratio(wide["inflow_n2"], wide["total_n2"])
+    wide["outflow_rate_n2"] = _ratio(wide["outflow_n2"], wide["total_n2"])
+    wide["net_migration_rate_n2"] = _ratio(wide["net_n2"], wide["total_n2"])
+
+    wide["net_fagi"] = wide["inflow_y2_agi"] - wide["outflow_y2_agi"]
+    wide["inflow_agi_share"] = _ratio(wide["inflow_y2_agi"], wide["total_y2_agi"])
+    wide["outflow_agi_share"] = _ratio(wide["outflow_y2_agi"], wide["total_y2_agi"])
+    return wide
+
+
+def add_real_agi_columns(wide, year, cpi, base_year=CPI_BASE_YEAR):
+    """
+    Add the CPI-U deflator to `base_year` dollars and real Year-2 AGI columns.
+    """
+    cpi_by_year = cpi.set_index("year")["cpi_u"]
+    deflator = cpi_by_year.get(base_year) / cpi_by_year.get(int(year), float("nan"))
+    wide["deflator"] = deflator
+    for col in ["inflow_y2_agi", "outflow_y2_agi", "total_y2_agi", "net_fagi"]:
+        wide[f"real_{col}"] = wide[col] * deflator
+    return wide
+
+
+def build_metrics_year(year):
+    """
+    soi_metrics rows for one year of the panel.
+    """
+    panel = load_soi_panel(years=[year])
+    wide = add_rate_columns(pivot_classes(panel, METRIC_KEYS))
+    return add_real_agi_columns(wide, year, read_reference_csv(CPI_PATH))
+
+
+def build_rollups_year(year):
+    """
+    soi_rollups rows for one year: class columns summed over the member
+    states of every region, division and the nation, then the derived
+    metrics recomputed from the sums.
+    """
+    panel = load_soi_panel(years=[year])
+    wide = pivot_classes(panel, ["year", "statefips", "agi_stub", "age_class"])
+    geo = read_reference_csv(STATEFIPS_PATH)[["statefips", "region", "division"]]
+    wide = wide.merge(geo, on="statefips", how="left", validate="many_to_one")
+    sum_cols = [f"{cls}_{metric}" for cls in CLASSES for metric in METRIC_COLS]
+
+    parts = []
+    for level, column in ROLLUP_LEVELS.items():
+        names = wide[column] if column else pd.Series("United States", index=wide.index)
+        part = (
+            wide.assign(geo_name=names)
+            .groupby(["year", "geo_name", "agi_stub", "age_class"], observed=True)[sum_cols]
+            .sum()
+            .reset_index()
+        )
+        part.insert(1, "geo_level", level)
+        parts.append(part)
+
+    rollups = pd.concat(parts, ignore_index=True)
+    rollups["geo_level"] = rollups["geo_level"].astype("category")
+    rollups["geo_name"] = rollups["geo_name"].astype("category")
+    rollups = add_rate_columns(rollups[ROLLUP_KEYS + sum_cols])
+    return add_real_agi_columns(rollups, year, read_reference_csv(CPI_PATH))
+
+
+def load_soi_metrics(columns=None, years=None, states=None):
+    """
+    Load the precomputed metric table (same filters as load_soi_panel).
+    """
+    return load_soi_panel(columns=columns, years=years, states=states, root=METRICS_PARQUET_DIR)
+
+
+def load_soi_rollups(columns=None, years=None, geo_level=None):
+    """
+    Load the region / division / national rollups, optionally for one level.
+    """
+    rollups = load_soi_panel(columns=columns, years=years, root=ROLLUPS_PARQUET_DIR)
+    if geo_level is not None:
+        rollups = rollups[rollups["geo_level"] == geo_level].reset_index(drop=True)
+    return rollups
+
+
+# name -> (output root, per-year builder, version, reference inputs)
+# Bump the version when a builder's output changes to rebuild every year.
+DERIVED_TABLES = {
+    "soi_metrics": (METRICS_PARQUET_DIR, build_metrics_year, 1, [CPI_PATH]),
+    "soi_rollups": (ROLLUPS_PARQUET_DIR, build_rollups_year, 1, [CPI_PATH, STATEFIPS_PATH]),
+}
+
+
+def partition_years(root):
+    return sorted(int(p.name.split("=", 1)[1]) for p in Path(root).glob("year=*"))
+
+
+def _inputs_digest(version, inputs):
+    digest = hashlib.sha256(f"{version}:{CPI_BASE_YEAR}".encode())
+    for path in inputs:
+        digest.update(file_fingerprint(Path(path))["sha256"].encode())
+    return digest.hexdigest()
+
+
+def refresh_derived_tables(changed_panel_years, manifest):
+    """
+    Rebuild the derived-table partitions that are out of date.
+
+    A year is rebuilt when its panel partition changed, when its derived
+    partition is missing, or (for every year) when the table's version or
+    reference inputs changed. Partitions for years no longer in the panel
+    are dropped. The manifest is updated in place.
+
+    Returns:
+        {table name: sorted list of years written or removed}
+    """
+    panel_years = partition_years(PANEL_PARQUET_DIR)
+    changed = {}
+
+    for name, (root, builder, version, inputs) in DERIVED_TABLES.items():
+        key = f"derived/{name}"
+        digest = _inputs_digest(version, inputs)
+        existing = partition_years(root)
+
+        if manifest.get(key, {}).get("inputs_sha256") != digest:
+            years = set(panel_years)
+        else:
+            years = (set(changed_panel_years) | (set(panel_years) - set(existing))) & set(panel_years)
+
+        removed = set(existing) - set(panel_years)
+        for year in removed:
+            drop_year_partition(root, year)
+        for year in sorted(years):
+            write_year_partition(builder(year), root, year)
+
+        manifest[key] = {"family": name, "version": version, "inputs_sha256": digest}
+        changed[name] = sorted(years | removed)
+    return changed
@@ -0,0 +1,465 @@
+"""
+Warm worker processes for execute_python_code.
+
+Generated code runs in a pool of long-lived worker processes instead of
+the app's own process. Each worker imports pandas / numpy / matplotlib /
+seaborn and loads the reference datasets once when it starts, so a tool
+call only pays for the code itself, and whatever memory the code
+allocates lives (and dies) with the worker: a worker is replaced after
+EXECUTOR_MAX_TASKS_PER_WORKER tasks (once no session lives on it), or as
+soon as it crashes.
+
+Every env passed to execute_python_code is a session pinned to one
+worker, which keeps the session's namespace between calls, so
+variables, functions, classes and imports defined by one call are there
+in the next, as with in-process execution. The first call ships the
+env's inputs (DataFrames and other picklable values) to the worker;
+later calls only ship names the caller added or rebound. Only
+`result_df` and `result_meta` (see RETURNED_NAMES) come back into the
+caller's env, with the result dict and the rendered figure images;
+intermediate tables stay in the worker. The namespace is dropped once
+the caller's env is garbage collected.
+
+Every task runs under the EXECUTION_* limits of config.py: the parent
+kills a worker that exceeds the wall-clock or resident-memory limit, and
+RLIMIT_CPU stops code that uses too much CPU time inside the worker. In
+each case the caller gets a LimitExceeded result it can retry from; the
+sessions of a killed worker start over from the caller's env on their
+next call.
+
+Spawned workers re-import the main module, so scripts that run the
+agents must guard their entry point with `if __name__ == "__main__":`.
+"""
+import atexit
+import multiprocessing as mp
+import os
+import pickle
+import threading
+import time
+import types
+import uuid
+import weakref
+
+from config import (
+    EXECUTOR_WORKERS,
+    EXECUTOR_MAX_TASKS_PER_WORKER,
+    EXECUTOR_PRELOAD_DATASETS,
+    EXECUTION_TIMEOUT_SECONDS,
+    EXECUTION_CPU_SECONDS,
+    EXECUTION_MAX_MEMORY_MB,
+)
+from figure_cache import unpack_figures
+from telemetry import TELEMETRY
+
+try:
+    import resource
+    import signal
+except ImportError:  # Windows: no CPU limit, wall-clock and memory are still enforced
+    resource = None
+
+# How often the parent checks a running task's wall clock and memory
+_WATCH_INTERVAL_SECONDS = 0.1
+
+# spawn works the same on every platform and never inherits the app's threads
+_CONTEXT = mp.get_context("spawn")
+
+# Names copied back into the caller's env after every task
+RETURNED_NAMES = ("result_df", "result_meta")
+# Where a caller's env keeps its session handle
+SESSION_KEY = "__executor_session__"
+
+
+def _shippable(value) -> bool:
+    """
+    Values worth sending between processes: data, not code, modules or
+    plot objects (figures come back through the result).
+    """
+    from matplotlib.artist import Artist
+
+    return not (isinstance(value, (types.ModuleType, Artist)) or callable(value))
+
+
+def _picklable(values: dict) -> dict:
+    out = {}
+    for name, value in values.items():
+        try:
+            pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            continue
+        out[name] = value
+    return out
+
+
+def _rss_mb(pid: int):
+    """
+    Resident memory of a process in MB (None where /proc is not available).
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _cpu_limit(cpu_seconds: float):
+    """
+    Arm RLIMIT_CPU so that SIGXCPU fires after `cpu_seconds` more CPU time.
+    Returns the previous limits, to restore after the task.
+    """
+    previous = resource.getrlimit(resource.RLIMIT_CPU)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+    hard = previous[1]
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    return previous
+
+
+def _worker_main(conn, preload: list):
+    """
+    Worker process loop. Receives ("run", session id, env updates, names
+    removed, code, preload_datasets, sessions to drop) and sends back
+    (result, RETURNED_NAMES values, dataset loads). None stops the worker.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+    import numpy  # noqa: F401  (imported once, reused by every task)
+    import pandas  # noqa: F401
+    import seaborn  # noqa: F401
+
+    from dataset_cache import DATASET_CACHE
+    from figure_cache import pack_figures
+    from tools import _execute_inline, ExecutionLimitExceeded
+
+    if resource is not None:
+        def on_cpu_limit(signum, frame):
+            raise ExecutionLimitExceeded(
+                "cpu_seconds", EXECUTION_CPU_SECONDS,
+                f"Execution used more than {EXECUTION_CPU_SECONDS} s of CPU time and was stopped. "
+                "Filter the data earlier or use vectorized operations instead of loops.",
+            )
+        signal.signal(signal.SIGXCPU, on_cpu_limit)
+
+    # Records stay buffered until the parent collects a task's dataset loads;
+    # the preloading below belongs to no run
+    TELEMETRY.batch_size = float("inf")
+    for name in preload:
+        try:
+            DATASET_CACHE.get(name)
+        except Exception:
+            pass   # not built yet: loaded on first use instead
+    TELEMETRY.drain()
+    conn.send(("ready", os.getpid()))
+
+    namespaces = {}   # session id -> env
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        _, session_id, updates, removed, code, preload_datasets, drops = task
+        for dropped in drops:
+            namespaces.pop(dropped, None)
+        env = namespaces.setdefault(session_id, {})
+        env.update(updates)
+        for name in removed:
+            env.pop(name, None)
+
+        previous = _cpu_limit(EXECUTION_CPU_SECONDS) if resource is not None else None
+        try:
+            result = _execute_inline(env=env, code=code, preload_datasets=preload_datasets)
+        finally:
+            if previous is not None:
+                resource.setrlimit(resource.RLIMIT_CPU, previous)
+
+        returned = {name: env[name] for name in RETURNED_NAMES if name in env and _shippable(env[name])}
+        loads = [
+            (row["name"], row["duration_seconds"], row["success"])
+            for row in TELEMETRY.drain() if row["kind"] == "data_load"
+        ]
+        # Figure images live in this process's cache: ship the bytes
+        if "figures" in result:
+            result["figures"] = pack_figures(result["figures"])
+        try:
+            conn.send((result, returned, loads))
+        except Exception:
+            # Something the code produced does not pickle: drop just those values
+            conn.send((result, _picklable(returned), loads))
+
+
+class _Worker:
+    def __init__(self, preload: list):
+        parent_conn, child_conn = _CONTEXT.Pipe()
+        self.process = _CONTEXT.Process(target=_worker_main, args=(child_conn, preload), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.tasks = 0
+        self.ready = False
+        self.busy = False
+        self.alive = True
+        self.sessions = set()     # ids of the sessions whose namespace lives here
+        self.drops = []           # ids of sessions to forget with the next task
+
+    def wait_ready(self):
+        if not self.ready:
+            self.conn.recv()   # ("ready", pid), after imports and preloading
+            self.ready = True
+
+    def stop(self, timeout: float = 5.0):
+        self.alive = False
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def kill(self):
+        self.alive = False
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class _Session:
+    """
+    Handle kept in a caller's env (under SESSION_KEY) that pins the env to
+    the worker holding its namespace.
+    """
+
+    def __init__(self, pool):
+        # What the finalizer needs, without keeping the session alive
+        self.state = {"id": uuid.uuid4().hex, "worker": None}
+        self.synced = {}   # name -> value the worker's namespace holds for it
+        weakref.finalize(self, pool._forget, self.state)
+
+    def __reduce__(self):
+        # Copies of an env (e.g. pickled into a cache) start a session of their own
+        return (_unpickle_session, ())
+
+
+def _unpickle_session():
+    return None
+
+
+class WorkerPool:
+    """
+    Up to `size` warm worker processes, started on first use (or by
+    warm_up) and recycled after `max_tasks` tasks. Thread-safe: a session
+    runs one task at a time on its worker; other sessions use other
+    workers, or wait for theirs.
+    """
+
+    def __init__(self, size: int = EXECUTOR_WORKERS, max_tasks: int = EXECUTOR_MAX_TASKS_PER_WORKER,
+                 preload: list = EXECUTOR_PRELOAD_DATASETS):
+        self.size = max(1, size)
+        self.max_tasks = max_tasks
+        self.preload = list(preload)
+        self._workers = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def warm_up(self, wait: bool = False):
+        """
+        Start every worker now (in the background) instead of on first use;
+        with wait=True, return once they have finished starting.
+        """
+        with self._cond:
+            while len(self._workers) < self.size:
+                self._workers.append(_Worker(self.preload))
+            workers = list(self._workers)
+        if wait:
+            for worker in workers:
+                if not worker.busy:
+                    worker.wait_ready()
+
+    def _acquire(self, state: dict):
+        """
+        The session's worker once it is free (a new session gets the idle
+        worker with the fewest sessions). Returns (worker, reset), reset
+        being True if the session's namespace was lost with a killed worker.
+        """
+        reset = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Worker pool is shut down.")
+                worker = state["worker"]
+                if worker is not None and not worker.alive:
+                    state["worker"] = worker = None
+                    reset = True
+                if worker is None:
+                    idle = [w for w in self._workers if not w.busy]
+                    if idle:
+                        worker = min(idle, key=lambda w: len(w.sessions))
+                    elif len(self._workers) < self.size:
+                        worker = _Worker(self.preload)
+                        self._workers.append(worker)
+                    else:
+                        self._cond.wait()
+                        continue
+                    state["worker"] = worker
+                    worker.sessions.add(state["id"])
+                elif worker.busy:
+                    self._cond.wait()
+                    continue
+                worker.busy = True
+                return worker, reset
+
+    def _release(self, worker: _Worker, healthy: bool):
+        retired = None
+        with self._cond:
+            worker.busy = False
+            if not healthy or (worker.tasks >= self.max_tasks and not worker.sessions) or self._closed:
+                # Recycle: the replacement warms up while the next task waits for it
+                retired = worker
+                retired.alive = False
+                self._workers.remove(worker)
+                if not self._closed:
+                    self._workers.append(_Worker(self.preload))
+            self._cond.notify_all()
+        if retired is not None:
+            if healthy:
+                retired.stop()
+            else:
+                retired.kill()
+
+    def _forget(self, state: dict):
+        # Runs when a session's env is garbage collected, possibly in any thread
+        worker = state["worker"]
+        if worker is not None:
+            worker.sessions.discard(state["id"])
+            worker.drops.append(state["id"])
+
+    def run(self, env: dict, code: str, preload_datasets: bool = False) -> dict:
+        """
+        Run `code` in the namespace of env's session, then copy
+        RETURNED_NAMES back into `env`. Returns execute_python_code's result dict.
+        """
+        session = env.get(SESSION_KEY)
+        if not isinstance(session, _Session):
+            session = env[SESSION_KEY] = _Session(self)
+        worker, reset = self._acquire(session.state)
+        if reset:
+            session.synced.clear()
+
+        # Only what changed on the caller's side since the last task
+        updates = {
+            name: value for name, value in env.items()
+            if not name.startswith("__") and _shippable(value) and session.synced.get(name, _UNSET) is not value
+        }
+        removed = [name for name in session.synced if name not in env]
+        healthy = True
+        try:
+            worker.wait_ready()
+            drops, worker.drops = worker.drops, []
+            try:
+                worker.conn.send(("run", session.state["id"], updates, removed, code, preload_datasets, drops))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                updates = _picklable(updates)
+                worker.conn.send(("run", session.state["id"], updates, removed, code, preload_datasets, drops))
+            limit = self._watch(worker)
+            if limit is not None:
+                healthy = False
+                return limit
+            result, returned, loads = worker.conn.recv()
+            worker.tasks += 1
+            # Datasets the task loaded count towards the caller's run and step
+            for name, seconds, success in loads:
+                TELEMETRY.record("data_load", seconds, name=name, success=success)
+            if "figures" in result:
+                result["figures"] = unpack_figures(result["figures"])
+        except (EOFError, OSError) as e:
+            healthy = False
+            return {
+                "success": False,
+                "stdout": "",
+                "stderr": "",
+                "execution_time_seconds": 0.0,
+                "error": f"The worker process running the code exited unexpectedly ({type(e).__name__}).",
+                "error_type": "WorkerCrashed",
+            }
+        finally:
+            self._release(worker, healthy)
+
+        session.synced.update(updates)
+        for name in removed:
+            session.synced.pop(name, None)
+        for name in RETURNED_NAMES:
+            if name in returned:
+                env[name] = session.synced[name] = returned[name]
+            elif name in session.synced:
+                # The code deleted it
+                env.pop(name, None)
+                session.synced.pop(name)
+        if reset:
+            result["environment_reset"] = True
+            result["stderr"] = (
+                "[The worker holding this environment was stopped by an earlier limit; "
+                "variables defined by earlier calls are gone.]\n" + (result.get("stderr") or "")
+            )
+        return result
+
+    def _watch(self, worker: _Worker):
+        """
+        Wait for the worker's reply while enforcing the wall-clock and
+        memory limits. Returns a LimitExceeded result (after which the
+        worker is killed) or None once the reply is ready.
+        """
+        from tools import limit_exceeded_result
+
+        start = time.monotonic()
+        while not worker.conn.poll(_WATCH_INTERVAL_SECONDS):
+            elapsed = time.monotonic() - start
+            if elapsed > EXECUTION_TIMEOUT_SECONDS:
+                return limit_exceeded_result(
+                    "wall_clock_seconds", EXECUTION_TIMEOUT_SECONDS,
+                    f"Execution did not finish within {EXECUTION_TIMEOUT_SECONDS} s and was stopped. "
+                    "Filter the data earlier or aggregate before joining.",
+                    elapsed=elapsed,
+                )
+            rss = _rss_mb(worker.process.pid)
+            if rss is not None and rss > EXECUTION_MAX_MEMORY_MB:
+                return limit_exceeded_result(
+                    "memory_mb", EXECUTION_MAX_MEMORY_MB,
+                    f"Execution used {rss:.0f} MB of memory, more than the limit of {EXECUTION_MAX_MEMORY_MB} MB, "
+                    "and was stopped. Select fewer columns, filter before merging and avoid cross joins.",
+                    elapsed=elapsed,
+                )
+        return None
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            idle = [w for w in self._workers if not w.busy]
+            for worker in idle:
+                self._workers.remove(worker)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.stop()
+
+
+_UNSET = object()
+POOL = WorkerPool()
+atexit.register(POOL.shutdown)
+
+
+def warm_up():
+    """
+    Start the worker processes ahead of the first tool call (no-op unless
+    code runs in worker processes).
+    """
+    from config import EXECUTION_MODE
+
+    if EXECUTION_MODE == "process":
+        POOL.warm_up()
@@ -0,0 +1,96 @@
+"""
+Rendered figures, stored as image bytes in a content-addressed cache.
+
+Code execution renders every figure it creates right away (PNG or WebP
+at FIGURE_DPI, or SVG) and lets the Figure go, so no live artist trees
+are kept per session. Results carry a small FigureRef; the bytes live in
+FIGURE_CACHE under the SHA-256 of their content, so identical figures
+are stored once and a ref is cheap to cache, pickle and re-display.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from config import FIGURE_FORMAT, FIGURE_DPI, FIGURE_CACHE_MAX_BYTES
+
+MIME_TYPES = {"png": "image/png", "webp": "image/webp", "svg": "image/svg+xml"}
+
+
+@dataclass(frozen=True)
+class FigureRef:
+    key: str        # sha256 of the image bytes
+    format: str     # png | webp | svg
+    nbytes: int
+
+
+def render_figure(fig, fmt: str = FIGURE_FORMAT, dpi: int = FIGURE_DPI) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches="tight")
+    return buf.getvalue()
+
+
+class FigureCache:
+    """
+    LRU cache of figure images keyed by content hash, bounded by total bytes.
+    """
+
+    def __init__(self, max_bytes: int = FIGURE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> bytes
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes, fmt: str) -> FigureRef:
+        key = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                self._entries[key] = data
+                self._total_bytes += len(data)
+                while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._total_bytes -= len(evicted)
+        return FigureRef(key=key, format=fmt, nbytes=len(data))
+
+    def put_figure(self, fig, fmt: str = FIGURE_FORMAT, dpi: int = FIGURE_DPI) -> FigureRef:
+        return self.put(render_figure(fig, fmt=fmt, dpi=dpi), fmt)
+
+    def get(self, ref: FigureRef):
+        """
+        The image bytes for `ref`, or None if they were evicted.
+        """
+        with self._lock:
+            data = self._entries.get(ref.key)
+            if data is not None:
+                self._entries.move_to_end(ref.key)
+            return data
+
+    def pop(self, ref: FigureRef):
+        with self._lock:
+            data = self._entries.pop(ref.key, None)
+            if data is not None:
+                self._total_bytes -= len(data)
+            return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+FIGURE_CACHE = FigureCache()
+
+
+def pack_figures(refs: list) -> list:
+    """
+    (format, bytes) pairs for refs held in this process's cache, to send
+    to another process (e.g. from an executor worker to the app).
+    """
+    return [(ref.format, FIGURE_CACHE.pop(ref)) for ref in refs]
+
+
+def unpack_figures(payloads: list) -> list:
+    return [FIGURE_CACHE.put(data, fmt) for fmt, data in payloads if data is not None]
@@ -7,6 +7,8 @@ import sys
 from typing import Any, Dict, List
 import pandas as pd
 
+import metadata
+
 '''def load_metadata_text(fname: str) -> str:
     """
     Load a single metadata Markdown file from metadata/ directory.
@@ -28,18 +30,9 @@ def load_metadata_text() -> str:
     """
     Dynamically load all metadata Markdown files in the metadata/ directory.
     Returns a unified text blob to pass to the planner agent.
+    Kept for existing callers; the files are parsed once by metadata.py.
     """
-    metadata_dir = BASE_DIR / "data" / "metadata"
-    parts = []
-
-    # Load every .md file in alphabetical order
-    for md_file in sorted(metadata_dir.glob("*.md")):
-        header = f"\n# {md_file.stem.replace('_', ' ').upper()}\n"
-        parts.append(header)
-        parts.append(md_file.read_text(encoding="utf-8"))
-        parts.append("\n")
-
-    return "\n".join(parts)
+    return metadata.load_metadata_text()
 
 
 # load datasets function, not needed anymore
@@ -64,6 +57,7 @@ def load_datasets(datasets: List[Dict[str, Any]]) -> Dict[str, pd.DataFrame]:
 
 import json
 from matplotlib.figure import Figure
+from figure_cache import FigureRef
 
 def make_json_safe(obj):
     """
@@ -73,6 +67,8 @@ def make_json_safe(obj):
     if isinstance(obj, Figure):
         # We don't send the actual figure via JSON; just a placeholder
         return "<matplotlib.figure.Figure>"
+    elif isinstance(obj, FigureRef):
+        return f"<figure {obj.format}, {obj.nbytes} bytes>"
     elif isinstance(obj, dict):
         return {k: make_json_safe(v) for k, v in obj.items()}
     elif isinstance(obj, (list, tuple)):
@@ -80,35 +76,13 @@ def make_json_safe(obj):
     # You can add more cases here for numpy types, DataFrames, etc., if needed.
     return obj
 
-import csv
-import os
-from datetime import datetime
 
-
-def log_token_usage(agent_name: str, model: str, usage, LOG_PATH: str, extra_info: dict | None = None):
+def log_token_usage(agent_name: str, model: str, usage, LOG_PATH: str = None, extra_info: dict | None = None):
     """
-    Append a row of token usage stats to a CSV log file.
-    - agent_name: 'orchestrator', 'da_agent', 'ds_agent', etc.
-    - model: model name used for this call
-    - usage: resp.usage object from OpenAI
-    - extra_info: optional dict, e.g. {'user_question': '...', 'step_id': 3}
+    Record the token usage of one LLM call.
+    Kept for existing callers: the call goes to telemetry (see telemetry.py),
+    so LOG_PATH and extra_info are no longer used.
     """
-    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-
-    row = {
-        "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
-        "agent_name": agent_name,
-        "model": model,
-        "total_tokens": getattr(usage, "total_tokens", None),
-    }
-
-    if extra_info:
-        for k, v in extra_info.items():
-            row[k] = v
+    from telemetry import TELEMETRY
 
-    file_exists = os.path.exists(LOG_PATH)
-    with open(LOG_PATH, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=row.keys())
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(row)
+    TELEMETRY.record_llm(agent_name, model, usage, duration_seconds=0.0)
@@ -0,0 +1,227 @@
+"""
+Metadata service: the Markdown files in data/metadata, parsed once into
+sections and assembled per prompt under a token budget.
+
+Every file is split at its `## ` headings. Core sections (the panel
+schema, the default metric definitions) are always sent; the sections of
+other files are only added when the prompt mentions one of the file's
+trigger keywords, e.g. the CPI reference when real dollars are asked for.
+"""
+import re
+import threading
+from pathlib import Path
+
+from config import METADATA_TOKEN_BUDGET
+
+BASE_DIR = Path(__file__).resolve().parent
+METADATA_DIR = BASE_DIR / "data" / "metadata"
+
+# file stem -> section title prefixes that are always included ([] = whole file)
+CORE_SECTIONS = {
+    "index_agent": [],
+    "soi_inmigall_schema": [],
+    "soi_derived_metrics": ["1.", "9."],
+}
+
+# Section title prefixes of a table's column descriptions: for a triggered
+# file these are taken right after the core sections, before anything else
+COLUMN_SECTIONS = ["Column", "Expected Columns"]
+
+# file stem -> keywords (matched case-insensitively at word starts) that
+# make the file's sections relevant to a prompt
+TRIGGERS = {
+    "cpi_u_reference": ["real", "inflation", "cpi", "constant dollar", "constant-dollar", "deflat", "2024 dollar"],
+    "soi_derived_metrics": [
+        "rate", "net", "share", "percent", "%", "fagi", "agi", "income", "population",
+        "people", "individual", "real", "inflation", "weighted",
+    ],
+    "soi_flows_schema": [
+        "origin", "destination", "where", "came from", "come from", "went to", "moved from",
+        "moved to", "flow", "county", "counties", "sender", "source state", "between states",
+    ],
+    "soi_metrics_schema": [
+        "rate", "net", "share", "percent", "%", "fagi", "real", "inflation", "region",
+        "division", "national", "nation", "united states", "country",
+    ],
+    "state_fips_reference": [
+        "region", "division", "south", "west", "midwest", "northeast", "mountain",
+        "pacific", "atlantic", "central", "new england", "fips",
+    ],
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (about 4 characters per token for English text).
+    """
+    return len(text) // 4 + 1
+
+
+def _file_header(stem: str) -> str:
+    # Same header load_metadata_text has always used, so prompts look alike
+    return f"\n# {stem.replace('_', ' ').upper()}\n"
+
+
+def split_sections(stem: str, text: str) -> list:
+    """
+    Split one Markdown file at its level-2 headings.
+
+    Returns a list of {"file", "title", "text", "tokens"} dicts; the first
+    one (title "") holds everything before the first `## ` heading.
+    """
+    chunks = re.split(r"(?m)^(?=## )", text)
+    sections = []
+    for chunk in chunks:
+        if not chunk.strip():
+            continue
+        title = chunk.splitlines()[0][3:].strip() if chunk.startswith("## ") else ""
+        sections.append({"file": stem, "title": title, "text": chunk, "tokens": estimate_tokens(chunk)})
+    return sections
+
+
+def _matches(keyword: str, text: str) -> bool:
+    if not keyword[0].isalnum():
+        return keyword in text
+    return re.search(rf"\b{re.escape(keyword)}", text) is not None
+
+
+def _keyword_density(keywords: list, section: dict) -> float:
+    """
+    Keyword mentions per token, plus one per keyword in the section title.
+    """
+    text = section["text"].lower()
+    count = sum(len(re.findall(rf"\b{re.escape(k)}" if k[0].isalnum() else re.escape(k), text)) for k in keywords)
+    title_hits = sum(_matches(k, section["title"].lower()) for k in keywords)
+    return title_hits + count / section["tokens"]
+
+
+class MetadataStore:
+    """
+    Parsed metadata sections, loaded on first use and kept for the process.
+    """
+
+    def __init__(self, root=METADATA_DIR):
+        self.root = Path(root)
+        self._files = None   # stem -> list of sections, in file name order
+        self._lock = threading.Lock()
+
+    def files(self) -> dict:
+        with self._lock:
+            if self._files is None:
+                self._files = {
+                    md_file.stem: split_sections(md_file.stem, md_file.read_text(encoding="utf-8"))
+                    for md_file in sorted(self.root.glob("*.md"))
+                }
+            return self._files
+
+    def reload(self):
+        with self._lock:
+            self._files = None
+
+    def full_text(self) -> str:
+        """
+        Every metadata file, in file name order.
+        """
+        return self._render(self.files(), lambda s: True)
+
+    def _is_core(self, section: dict) -> bool:
+        prefixes = CORE_SECTIONS.get(section["file"])
+        if prefixes is None:
+            return False
+        return not prefixes or any(section["title"].startswith(p) for p in prefixes)
+
+    def select(self, query: str, budget: int = METADATA_TOKEN_BUDGET) -> str:
+        """
+        Metadata relevant to `query`, at most about `budget` tokens.
+
+        Core sections come first, then the column descriptions of triggered
+        files, then their other sections, taken in turn from each file so
+        one broad match cannot use up the budget. Sections that do not fit are skipped. The core block is
+        emitted first, then the other chosen sections, each in file and
+        section order, so the same selection always produces the same text.
+        """
+        query = (query or "").lower()
+        files = self.files()
+
+        # Round-robin over triggered files (most keyword hits first), each
+        # file offering its sections densest in the matched keywords first
+        queues = []
+        columns = []
+        for stem, sections in files.items():
+            matched = [k for k in TRIGGERS.get(stem, []) if _matches(k, query)]
+            if not matched:
+                continue
+            optional = [s for s in sections if not self._is_core(s)]
+            # A table is no use to the agent without its column meanings
+            columns += [s for s in optional if any(s["title"].startswith(p) for p in COLUMN_SECTIONS)]
+            optional = [s for s in optional if s not in columns]
+            optional.sort(key=lambda s: -_keyword_density(matched, s))
+            queues.append((len(matched), optional))
+        queues.sort(key=lambda q: -q[0])
+        triggered = [
+            queue[i]
+            for i in range(max((len(q) for _, q in queues), default=0))
+            for _, queue in queues
+            if i < len(queue)
+        ]
+        core = [s for sections in files.values() for s in sections if self._is_core(s)]
+
+        chosen = set()
+        used = 0
+        for section in core + columns + triggered:
+            # A file's heading line comes with its first chosen section
+            intro = files[section["file"]][0]
+            cost = section["tokens"]
+            if section is not intro and id(intro) not in chosen:
+                cost += intro["tokens"]
+            if used + cost > budget:
+                continue
+            chosen.update({id(section), id(intro)})
+            used += cost
+
+        # Core sections first: the same for every query, so they form a
+        # byte-identical prompt prefix that providers can cache across runs
+        core_ids = {id(s) for s in core} | {id(files[s["file"]][0]) for s in core}
+        core_files = {s["file"] for s in core if id(s) in chosen}
+        return (
+            self._render(files, lambda s: id(s) in core_ids and id(s) in chosen)
+            + self._render(files, lambda s: id(s) not in core_ids and id(s) in chosen, headed=core_files)
+        )
+
+    def core_text(self) -> str:
+        """
+        The core sections alone (the common prefix of every selection).
+        """
+        return self.select("", budget=float("inf"))
+
+    @staticmethod
+    def _render(files: dict, keep, headed=()) -> str:
+        """
+        Kept sections under their file headers (`headed` files already have one).
+        """
+        parts = []
+        for stem, sections in files.items():
+            selected = [s["text"] for s in sections if keep(s)]
+            if selected:
+                if stem not in headed:
+                    parts.append(_file_header(stem))
+                parts.append("".join(selected))
+                parts.append("\n")
+        return "\n".join(parts)
+
+
+METADATA = MetadataStore()
+
+
+def load_metadata_text() -> str:
+    """
+    All metadata as one text blob (parsed once per process).
+    """
+    return METADATA.full_text()
+
+
+def select_metadata(query: str, budget: int = METADATA_TOKEN_BUDGET) -> str:
+    """
+    Metadata sections relevant to `query` under a token budget.
+    """
+    return METADATA.select(query, budget=budget)
@@ -0,0 +1,367 @@
+from __future__ import annotations
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+from config import QUERY_MAX_RESULT_ROWS
+from dataset_cache import DATASET_CACHE
+
+
+ALLOWED_FILTER_OPS = {
+    "in",
+    "not_in",
+    "between",
+    "equals",
+    "not_equals",
+    "gt",
+    "gte",
+    "lt",
+    "lte",
+}
+
+ALLOWED_AGGS = {"sum", "count", "mean", "avg", "min", "max"}
+
+# Rows of the result echoed back to the model; the full table is kept as result_df
+PREVIEW_ROWS = 20
+
+
+def _filter_mask(df: pd.DataFrame, filters: Optional[Dict[str, Dict[str, Any]]]) -> np.ndarray:
+    """
+    Build one boolean mask for all top-level filters.
+
+    filters is a mapping: column -> {op: value, ...}
+    Supported ops: in, not_in, between, equals, not_equals, gt, gte, lt, lte.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if not filters:
+        return mask
+
+    for col, cond in filters.items():
+        if col not in df.columns:
+            raise ValueError(f"Filter column '{col}' does not exist.")
+        # Plain values are shorthand for equality
+        if not isinstance(cond, dict):
+            cond = {"in": cond} if isinstance(cond, list) else {"equals": cond}
+        values = df[col]
+        for op, val in cond.items():
+            if op not in ALLOWED_FILTER_OPS:
+                raise ValueError(f"Unsupported filter op '{op}' for column '{col}'")
+
+            if op == "in":
+                m = values.isin(val)
+            elif op == "not_in":
+                m = ~values.isin(val)
+            elif op == "between":
+                lo, hi = val
+                m = (values >= lo) & (values <= hi)
+            elif op == "equals":
+                m = values == val
+            elif op == "not_equals":
+                m = values != val
+            elif op == "gt":
+                m = values > val
+            elif op == "gte":
+                m = values >= val
+            elif op == "lt":
+                m = values < val
+            else:
+                m = values <= val
+            # Comparisons on nullable columns give <NA> for missing values: no match
+            mask &= m.fillna(False).to_numpy(dtype=bool)
+
+    return mask
+
+
+def _aggregate_metrics(
+    df: pd.DataFrame,
+    group_by: List[str],
+    metrics: List[Dict[str, Any]],
+) -> pd.DataFrame:
+    """
+    Compute all metrics in a single groupby pass, returning a DataFrame
+    with columns: group_by + metric_names.
+
+    Per-metric filters are applied by masking the metric's input column
+    (rows failing the filter become NaN) instead of re-grouping a filtered
+    copy for every metric.
+    """
+    inputs = {}
+    named_aggs = {}
+    sum_counts = {}
+    for i, metric in enumerate(metrics):
+        name = metric["name"]
+        agg = str(metric["agg"]).lower()
+        col = metric["column"]
+        m_filter = metric.get("filter")
+
+        if agg not in ALLOWED_AGGS:
+            raise ValueError(f"Unsupported aggregation '{agg}' in metric '{name}'")
+        if col not in df.columns:
+            raise ValueError(f"Metric column '{col}' does not exist.")
+
+        values = df[col]
+        if m_filter:
+            values = values.where(_filter_mask(df, m_filter))
+
+        tmp = f"__m{i}"
+        inputs[tmp] = values
+        named_aggs[name] = (tmp, "mean" if agg == "avg" else agg)
+        if agg == "sum":
+            # A sum over no matching rows is missing, not 0
+            sum_counts[name] = f"__n{i}"
+            named_aggs[sum_counts[name]] = (tmp, "count")
+
+    frame = df[group_by].assign(**inputs) if group_by else pd.DataFrame(inputs)
+    if group_by:
+        result = frame.groupby(group_by, dropna=False, observed=True, sort=True).agg(**named_aggs).reset_index()
+    else:
+        result = pd.DataFrame({name: [frame[tmp].agg(func)] for name, (tmp, func) in named_aggs.items()})
+
+    for name, count_col in sum_counts.items():
+        result[name] = result[name].where(result[count_col] > 0)
+    return result.drop(columns=list(sum_counts.values()))
+
+
+def _load_datasets(datasets: List[Dict[str, Any]]) -> Dict[str, pd.DataFrame]:
+    """
+    Map alias -> cached DataFrame. Each dataset dict names a table of the
+    dataset cache (soi_panel, state_flows, cpi_u, ...) and an optional alias.
+    """
+    dfs: Dict[str, pd.DataFrame] = {}
+    for ds in datasets:
+        name = ds.get("name")
+        alias = ds.get("alias") or name
+        if name not in DATASET_CACHE.datasets:
+            raise ValueError(
+                f"Unknown dataset '{name}'. Available: {sorted(DATASET_CACHE.datasets)}"
+            )
+        dfs[alias] = DATASET_CACHE.get(name)
+    return dfs
+
+
+def _apply_joins(
+    dfs: Dict[str, pd.DataFrame],
+    datasets: List[Dict[str, Any]],
+    joins: List[Dict[str, Any]],
+) -> pd.DataFrame:
+    """
+    Combine multiple datasets using the specified joins.
+
+    - The first dataset in `datasets` is the "base".
+    - Joins connect this base to other datasets (possibly in a chain).
+    - Join spec:
+        {
+          "type": "inner" | "left" | "right" | "outer",
+          "left_dataset": "m",
+          "right_dataset": "s",
+          "on": [
+            {"left_column": "state", "right_column": "state"},
+            ...
+          ]
+        }
+    """
+    if not datasets:
+        raise ValueError("No datasets specified in query.")
+
+    base_alias = datasets[0].get("alias") or datasets[0].get("name")
+
+    # If only one dataset and no joins, just return that DataFrame
+    if len(datasets) == 1 and not joins:
+        return dfs[base_alias]
+
+    if len(datasets) > 1 and not joins:
+        raise ValueError("Multiple datasets provided but no joins specified.")
+
+    combined_df = dfs[base_alias]
+    combined_aliases = {base_alias}
+
+    # Iteratively apply joins where at least one side is already combined
+    remaining_joins = list(joins)
+
+    while remaining_joins:
+        progress = False
+        next_joins: List[Dict[str, Any]] = []
+
+        for j in remaining_joins:
+            join_type = j.get("type", "inner").lower()
+            left_ds = j["left_dataset"]
+            right_ds = j["right_dataset"]
+            on_spec = j.get("on") or []
+
+            left_cols = [o["left_column"] for o in on_spec]
+            right_cols = [o["right_column"] for o in on_spec]
+
+            if left_ds in combined_aliases and right_ds in dfs:
+                right_df = dfs[right_ds]
+                combined_df = combined_df.merge(
+                    right_df,
+                    left_on=left_cols,
+                    right_on=right_cols,
+                    how=join_type,
+                    suffixes=("", f"_{right_ds}"),
+                )
+                combined_aliases.add(right_ds)
+                progress = True
+            elif right_ds in combined_aliases and left_ds in dfs:
+                left_df = dfs[left_ds]
+                combined_df = left_df.merge(
+                    combined_df,
+                    left_on=left_cols,
+                    right_on=right_cols,
+                    how=join_type,
+                    suffixes=(f"_{left_ds}", ""),
+                )
+                combined_aliases.add(left_ds)
+                progress = True
+            else:
+                next_joins.append(j)
+
+        if not progress:
+            raise ValueError(
+                "Could not resolve all joins. "
+                "Check that joins form a connected graph starting from the first dataset."
+            )
+
+        remaining_joins = next_joins
+
+    return combined_df
+
+
+def _check_result_rows(n: int):
+    if n > QUERY_MAX_RESULT_ROWS:
+        raise ValueError(
+            f"Query returned more than {QUERY_MAX_RESULT_ROWS} rows; "
+            "filter further, set a limit or aggregate with group_by / metrics."
+        )
+
+
+def run_query(query: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Execute a declarative query over the cached datasets and return the result table.
+
+    Query keys:
+      - datasets: list of {name, alias}; the first one is the base table
+      - joins: list of join specs (type, left_dataset, right_dataset, on)
+      - filters: top-level filters (column -> {op: val})
+      - group_by: list of columns (empty = aggregate the whole filtered table)
+      - metrics: list of {name, agg, column, filter}
+      - columns: columns to return when there are neither group_by nor
+        metrics (the filtered rows themselves; default: all columns)
+      - derived_columns: list of {name, expression}, evaluated with DataFrame.eval
+      - sort: list of {column, direction}
+      - limit: optional int
+
+    Raises ValueError for unsupported features, invalid queries or results
+    larger than QUERY_MAX_RESULT_ROWS.
+    """
+    datasets = query.get("datasets") or []
+    joins = query.get("joins") or []
+    filters = query.get("filters") or {}
+    group_by = query.get("group_by") or []
+    metrics = query.get("metrics") or []
+    columns = query.get("columns") or []
+    derived_columns = query.get("derived_columns") or []
+    sort_spec = query.get("sort") or []
+    limit = query.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid limit value: {limit!r}")
+
+    dfs = _load_datasets(datasets)
+    df = _apply_joins(dfs, datasets, joins)
+
+    mask = _filter_mask(df, filters)
+    if not mask.all():
+        df = df[mask]
+
+    missing = [c for c in group_by if c not in df.columns]
+    if missing:
+        raise ValueError(f"group_by columns do not exist: {missing}")
+
+    if metrics:
+        result = _aggregate_metrics(df, group_by, metrics)
+    elif group_by:
+        result = df[group_by].drop_duplicates().sort_values(group_by).reset_index(drop=True)
+    else:
+        # A plain selection: the filtered rows, projected to `columns`
+        missing = [c for c in columns if c not in df.columns]
+        if missing:
+            raise ValueError(f"Selected columns do not exist: {missing}")
+        if limit is None:
+            # Fail before copying a table that would be rejected anyway
+            _check_result_rows(len(df))
+        elif not sort_spec:
+            df = df.head(limit)
+        result = df[columns].copy() if columns else df.copy()
+
+    # Derived columns use metric names as variables, e.g. "inflow - outflow"
+    for d in derived_columns:
+        result[d["name"]] = result.eval(d["expression"])
+
+    if sort_spec:
+        result = result.sort_values(
+            by=[s["column"] for s in sort_spec],
+            ascending=[s.get("direction", "asc").lower() == "asc" for s in sort_spec],
+        )
+
+    if limit is not None:
+        result = result.head(limit)
+    _check_result_rows(len(result))
+
+    # Categorical keys become plain values so the result behaves like a fresh table
+    for col in result.columns:
+        if isinstance(result[col].dtype, pd.CategoricalDtype):
+            result[col] = result[col].astype(result[col].cat.categories.dtype)
+
+    return result.reset_index(drop=True)
+
+
+def preview_records(df: pd.DataFrame, n: int = PREVIEW_ROWS) -> List[Dict[str, Any]]:
+    """
+    First n rows of df as JSON-friendly records (missing values become None).
+    """
+    preview = df.head(n)
+    preview = preview.astype(object).where(preview.notna(), None)
+    return preview.to_dict(orient="records")
+
+
+def execute_query(query: Dict[str, Any], result_meta: Optional[Dict[str, Any]] = None) -> dict:
+    """
+    Tool entry point: run a query and report the outcome without raising.
+
+    Returns:
+        dict with:
+            - success: bool
+            - dataframe: result table (not JSON serializable; stripped before
+              the result is sent back to the model)
+            - rows: first PREVIEW_ROWS rows as records
+            - row_count, columns
+            - result_meta: the metadata supplied with the query
+            - execution_time_seconds: float
+            - error / error_type (only on failure)
+    """
+    start_time = time.time()
+    try:
+        result = run_query(query)
+    except Exception as e:
+        # Any bad model-written query (e.g. a derived expression pandas cannot
+        # eval) is reported back to the agent instead of ending the step
+        return {
+            "success": False,
+            "execution_time_seconds": round(time.time() - start_time, 4),
+            "error": str(e),
+            "error_type": type(e).__name__,
+        }
+
+    return {
+        "success": True,
+        "dataframe": result,
+        "rows": preview_records(result),
+        "row_count": int(len(result)),
+        "columns": list(result.columns),
+        "result_meta": result_meta or {},
+        "execution_time_seconds": round(time.time() - start_time, 4),
+    }
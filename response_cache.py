@@ -0,0 +1,150 @@
+"""
+Persistent, content-addressed cache for agent outputs.
+
+Entries are keyed on everything that determines an LLM answer (agent
+kind, model, system prompt, metadata, messages and, for data steps, the
+processed-data version), stored as one pickle file per key, and expire
+after a TTL. The cache directory is kept under a size budget by evicting
+the least recently used entries.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from pathlib import Path
+
+from config import (
+    RESPONSE_CACHE_DIR,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_MAX_BYTES,
+)
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _normalize(text: str) -> str:
+    # Questions that only differ in whitespace share an entry
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def data_version() -> str:
+    """
+    Hash of the processed-data manifest, so cached data results are not
+    served after the panel or flow store is rebuilt from new raw files.
+    """
+    manifest = BASE_DIR / "data" / "processed" / "manifest.json"
+    if not manifest.exists():
+        return ""
+    return hashlib.sha256(manifest.read_bytes()).hexdigest()
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+class ResponseCache:
+    def __init__(self, root=RESPONSE_CACHE_DIR, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        # Relative roots live in the repository, whatever the working directory
+        self.root = BASE_DIR / root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None   # size of the cache directory, scanned on first set
+
+    def key(self, kind: str, model: str, system_prompt: str, metadata_text: str,
+            messages: list, extra: str = "") -> str:
+        """
+        Content address of one agent call.
+        """
+        payload = {
+            "kind": kind,
+            "model": model,
+            "system": _sha256(system_prompt),
+            "metadata": _sha256(metadata_text or ""),
+            "messages": [_normalize(m) for m in messages],
+            "extra": extra,
+        }
+        return _sha256(json.dumps(payload, sort_keys=True))
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.pkl"
+
+    def get(self, key: str):
+        """
+        Cached value for key, or None if missing or expired.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            if time.time() - entry["created"] > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                return None
+            # Touch so size-based eviction drops the least recently used entries
+            os.utime(path)
+            return entry["value"]
+        except Exception:
+            # Missing, evicted meanwhile, truncated or unreadable: a cache miss
+            return None
+
+    def set(self, key: str, value):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"created": time.time(), "value": value}, f)
+        added = tmp_path.stat().st_size - _size(path)
+        os.replace(tmp_path, path)
+        self._evict(added)
+
+    def _entries(self) -> list:
+        entries = []
+        for p in self.root.glob("*/*.pkl"):
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        return entries
+
+    def _evict(self, added: int):
+        """
+        Drop least recently used entries once the directory is over budget.
+        The directory is only walked on the first set and when over budget.
+        """
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._total_bytes += added
+            if self._total_bytes <= self.max_bytes:
+                return
+
+            files = self._entries()
+            total = sum(size for _, size, _ in files)
+            for _, size, p in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                p.unlink(missing_ok=True)
+                total -= size
+            self._total_bytes = total
+
+    def clear(self):
+        with self._lock:
+            for p in self.root.glob("*/*.pkl"):
+                p.unlink(missing_ok=True)
+            self._total_bytes = 0
+
+
+RESPONSE_CACHE = ResponseCache()
@@ -0,0 +1,157 @@
+"""
+DuckDB views over the processed Parquet stores and reference CSVs.
+
+The views read the files in place: filters on `year` prune hive
+partitions and filters on other columns use Parquet row-group statistics,
+so a query only scans the data it needs. One in-memory database holds the
+view definitions, refreshed when the processed data changes; each call
+runs on its own cursor, so concurrent plan steps can query it safely.
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from config import SQL_MAX_RESULT_ROWS
+from data_parsing import (
+    PANEL_PARQUET_DIR,
+    METRICS_PARQUET_DIR,
+    ROLLUPS_PARQUET_DIR,
+    FLOWS_DIR,
+    REFERENCE_DIR,
+)
+from query_engine import preview_records
+from response_cache import data_version
+
+
+def _parquet_view(root) -> str:
+    return (
+        f"SELECT * FROM read_parquet('{root.as_posix()}/*/*.parquet', "
+        "hive_partitioning = true, hive_types = {'year': SMALLINT})"
+    )
+
+
+# view name -> (file or directory that must exist, SELECT defining the view)
+VIEWS = {
+    "soi_panel": (PANEL_PARQUET_DIR, _parquet_view(PANEL_PARQUET_DIR)),
+    "soi_metrics": (METRICS_PARQUET_DIR, _parquet_view(METRICS_PARQUET_DIR)),
+    "soi_rollups": (ROLLUPS_PARQUET_DIR, _parquet_view(ROLLUPS_PARQUET_DIR)),
+    "state_flows": (FLOWS_DIR / "state", _parquet_view(FLOWS_DIR / "state" / "by_destination")),
+    "county_flows": (FLOWS_DIR / "county", _parquet_view(FLOWS_DIR / "county" / "by_destination")),
+    "cpi_u": (
+        REFERENCE_DIR / "CPI_U.csv",
+        f"SELECT \"Year\" AS year, cpi_u FROM read_csv_auto('{(REFERENCE_DIR / 'CPI_U.csv').as_posix()}')",
+    ),
+    "statefips_dict": (
+        REFERENCE_DIR / "statefips_dict.csv",
+        f"SELECT * FROM read_csv_auto('{(REFERENCE_DIR / 'statefips_dict.csv').as_posix()}')",
+    ),
+}
+
+_connection = None
+_views = []
+_views_state = None   # (data version, available views) the views were created for
+_lock = threading.Lock()
+
+
+def _get_connection():
+    """
+    Shared in-memory database with one view per available dataset.
+
+    The views are (re)created whenever the processed-data version or the
+    set of built datasets changes, so tables built after the first query
+    (derived tables, newly ingested years) are exposed too.
+    """
+    global _connection, _views_state
+    # Datasets that have not been built yet are simply not exposed
+    available = [name for name, (path, _) in VIEWS.items() if path.exists()]
+    state = (data_version(), available)
+    with _lock:
+        if _connection is None:
+            _connection = duckdb.connect()
+        if state != _views_state:
+            for name, (_, select) in VIEWS.items():
+                if name in available:
+                    _connection.execute(f"CREATE OR REPLACE VIEW {name} AS {select}")
+                else:
+                    _connection.execute(f"DROP VIEW IF EXISTS {name}")
+            _views[:] = available
+            _views_state = state
+        return _connection
+
+
+def _plain_arrow_types(table: pa.Table) -> pa.Table:
+    """
+    Cast DuckDB's wide decimals (e.g. SUM over BIGINT) to int64 / float64.
+    """
+    for i, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type):
+            column = table.column(i)
+            try:
+                column = column.cast(pa.int64() if field.type.scale == 0 else pa.float64())
+            except pa.ArrowInvalid:
+                column = column.cast(pa.float64(), safe=False)
+            table = table.set_column(i, field.name, column)
+    return table
+
+
+def query_sql(sql: str) -> pd.DataFrame:
+    """
+    Run one read-only SELECT statement and return the result as a DataFrame
+    with numpy dtypes, like the query engine's and pandas code's results.
+
+    Raises ValueError for non-SELECT statements or results larger than
+    SQL_MAX_RESULT_ROWS, and duckdb.Error for invalid SQL.
+    """
+    con = _get_connection()
+    statements = duckdb.extract_statements(sql)
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise ValueError("run_sql accepts exactly one SELECT statement.")
+
+    cursor = con.cursor()
+    try:
+        table = cursor.sql(sql).limit(SQL_MAX_RESULT_ROWS + 1).fetch_arrow_table()
+    finally:
+        cursor.close()
+
+    if table.num_rows > SQL_MAX_RESULT_ROWS:
+        raise ValueError(
+            f"Query returned more than {SQL_MAX_RESULT_ROWS} rows; "
+            "aggregate or filter further so only the result table is returned."
+        )
+    return _plain_arrow_types(table).to_pandas()
+
+
+def run_sql(sql: str, result_meta: Optional[Dict[str, Any]] = None) -> dict:
+    """
+    Tool entry point: run a SQL query and report the outcome without raising.
+
+    Returns the same fields as query_engine.execute_query: success,
+    dataframe, rows, row_count, columns, result_meta,
+    execution_time_seconds, and error / error_type on failure.
+    """
+    start_time = time.time()
+    try:
+        result = query_sql(sql)
+    except (ValueError, duckdb.Error) as e:
+        return {
+            "success": False,
+            "execution_time_seconds": round(time.time() - start_time, 4),
+            "error": str(e),
+            "error_type": type(e).__name__,
+            "available_views": list(_views),
+        }
+
+    return {
+        "success": True,
+        "dataframe": result,
+        "rows": preview_records(result),
+        "row_count": int(len(result)),
+        "columns": list(result.columns),
+        "result_meta": result_meta or {},
+        "execution_time_seconds": round(time.time() - start_time, 4),
+    }
@@ -1,19 +1,40 @@
-from openai import OpenAI, OpenAIError
+from openai import AuthenticationError, OpenAIError
 import streamlit as st
 
+from clients import get_client, discard_client
+from figure_cache import FIGURE_CACHE
+
 def verify_api_key(api_key: str) -> bool:
     """
     Try a tiny OpenAI call to verify the key.
     You can use models.list() since it's very cheap and simple.
+    The client comes from the shared registry, so the agents reuse its
+    connections once the key is verified.
     """
     try:
-        client = OpenAI(api_key=api_key)
+        client = get_client(api_key)
         # This will fail quickly if the key is invalid
         client.models.list()
         return True
+    except AuthenticationError:
+        # Only a rejected key invalidates the shared client, not a transient failure
+        discard_client(api_key)
+        return False
     except OpenAIError:
-        return False 
+        return False
     
+def show_figure(ref):
+    """
+    Display a rendered figure from the figure cache.
+    """
+    data = FIGURE_CACHE.get(ref)
+    if data is None:
+        st.caption("(figure no longer cached)")
+    elif ref.format == "svg":
+        st.image(data.decode("utf-8"))
+    else:
+        st.image(data)
+
 def init_session_state():
     if "page" not in st.session_state:
         st.session_state.page = "api_key"   # "api_key" or "ask_agent"
@@ -65,8 +86,7 @@ def page_api_key():
             st.error("API key is invalid. Please check and try again.")
 
 def page_ask_agent():
-    from agents import run_all_agents
-    from helper import load_metadata_text
+    from agents import run_all_agents_stream
 
     st.subheader("Step 2: Ask the IRS SOI Migration Data Agent")
 
@@ -99,24 +119,38 @@ def page_ask_agent():
             st.error("OpenAI API key missing. Please go back and enter it again.")
             return
 
-        metadata_text = load_metadata_text()
-
-        with st.spinner("Running agents..."):
-            result = run_all_agents(
-                original_prompt=user_prompt,
-                metadata_text=metadata_text,
-                focus=focus,
-                OpenAI_API_key=st.session_state.api_key,
-                verbose=False,
-            )
-
+        # Show progress as the pipeline produces it instead of waiting for the end
+        status = st.status("Planning the analysis...", expanded=True)
         st.subheader("Answer")
-        st.write(result.get("summary", result))
-
-        figs = result.get("figures", [])
-        for fig in figs:
-            try:
-                st.pyplot(fig)
-            except Exception:
-                pass
-
+        summary_box = st.empty()
+        summary_text = ""
+        result = {}
+
+        for event in run_all_agents_stream(
+            original_prompt=user_prompt,
+            focus=focus,
+            OpenAI_API_key=st.session_state.api_key,
+            verbose=False,
+        ):
+            kind = event["type"]
+            if kind == "plan":
+                status.update(label=f"Running {len(event['plan'])} analysis steps...")
+                for step in event["plan"]:
+                    status.write(f"Step {step['step_id']}: {step['goal']}")
+            elif kind == "step_done":
+                status.write(f"Step {event['step_id']} done.")
+            elif kind == "figure":
+                show_figure(event["figure"])
+            elif kind == "summary_delta":
+                if not summary_text:
+                    status.update(label="Writing the summary...")
+                summary_text += event["text"]
+                summary_box.markdown(summary_text)
+            elif kind == "done":
+                result = event["result"]
+
+        status.update(label="Done", state="complete", expanded=False)
+        if result.get("type") == "clarification":
+            summary_box.write(result.get("question"))
+        else:
+            summary_box.write(result.get("summary", result))
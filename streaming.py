@@ -0,0 +1,101 @@
+"""
+Helpers for streamed chat completions.
+
+A streamed call returns chunks instead of one response. StreamAssembler
+forwards content deltas to a callback as they arrive and rebuilds the
+ChatCompletion the agent loops expect (content, tool calls and usage),
+so a loop handles streamed and non-streamed calls the same way.
+"""
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_message_function_tool_call import (
+    ChatCompletionMessageFunctionToolCall,
+    Function,
+)
+
+
+def stream_options(on_delta) -> dict:
+    """
+    Extra chat.completions.create arguments for a streamed call (none if
+    there is no delta callback). include_usage adds a final usage chunk.
+    """
+    if on_delta is None:
+        return {}
+    return {"stream": True, "stream_options": {"include_usage": True}}
+
+
+class StreamAssembler:
+    """
+    Accumulates ChatCompletionChunk objects into one ChatCompletion.
+    """
+
+    def __init__(self, on_delta=None):
+        self.on_delta = on_delta
+        self.id = ""
+        self.model = ""
+        self.created = 0
+        self.content = []
+        self.tool_calls = {}   # index -> {"id", "name", "arguments"}
+        self.finish_reason = None
+        self.usage = None
+
+    def add(self, chunk):
+        self.id = chunk.id or self.id
+        self.model = chunk.model or self.model
+        self.created = chunk.created or self.created
+        if chunk.usage is not None:
+            self.usage = chunk.usage
+
+        for choice in chunk.choices:
+            delta = choice.delta
+            if delta.content:
+                self.content.append(delta.content)
+                if self.on_delta is not None:
+                    self.on_delta(delta.content)
+            # Tool calls arrive in pieces: id and name first, then argument fragments
+            for tc in delta.tool_calls or []:
+                entry = self.tool_calls.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+                if tc.id:
+                    entry["id"] = tc.id
+                if tc.function is not None:
+                    entry["name"] += tc.function.name or ""
+                    entry["arguments"] += tc.function.arguments or ""
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+
+    def completion(self) -> ChatCompletion:
+        tool_calls = [
+            ChatCompletionMessageFunctionToolCall(
+                id=entry["id"] or "",
+                type="function",
+                function=Function(name=entry["name"], arguments=entry["arguments"]),
+            )
+            for _, entry in sorted(self.tool_calls.items())
+        ]
+        message = ChatCompletionMessage(
+            role="assistant",
+            content="".join(self.content) or None,
+            tool_calls=tool_calls or None,
+        )
+        return ChatCompletion(
+            id=self.id,
+            choices=[Choice(index=0, finish_reason=self.finish_reason or "stop", message=message)],
+            created=self.created,
+            model=self.model,
+            object="chat.completion",
+            usage=self.usage,
+        )
+
+
+def collect_stream(stream, on_delta=None) -> ChatCompletion:
+    assembler = StreamAssembler(on_delta)
+    for chunk in stream:
+        assembler.add(chunk)
+    return assembler.completion()
+
+
+async def collect_stream_async(stream, on_delta=None) -> ChatCompletion:
+    assembler = StreamAssembler(on_delta)
+    async for chunk in stream:
+        assembler.add(chunk)
+    return assembler.completion()
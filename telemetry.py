@@ -0,0 +1,217 @@
+"""
+Per-call latency and token telemetry.
+
+Every LLM call, tool execution and dataset load is recorded with its wall
+time, token counts and the run / step it belongs to. The run and step ids
+live in context variables, so they follow the work into worker threads
+(submitted with contextvars.copy_context) and asyncio tasks.
+
+Records are buffered in memory and appended to a CSV in batches; the
+records of a run are also kept until run_summary() turns them into a
+per-run report of where the time went (LLM, code, data loading).
+"""
+import atexit
+import contextvars
+import csv
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import TELEMETRY_ENABLED, TELEMETRY_PATH, TELEMETRY_BATCH_SIZE
+
+RUN_ID = contextvars.ContextVar("run_id", default=None)
+STEP_ID = contextvars.ContextVar("step_id", default=None)
+
+FIELDS = [
+    "timestamp",
+    "run_id",
+    "step_id",
+    "kind",          # run | llm | tool | figure_render | data_load
+    "agent",
+    "name",          # tool or dataset name
+    "model",
+    "duration_seconds",
+    "prompt_tokens",
+    "completion_tokens",
+    "cached_tokens",
+    "total_tokens",
+    "success",
+    "error",         # exception type of a call that raised
+]
+
+
+class Telemetry:
+    def __init__(self, path=TELEMETRY_PATH, batch_size: int = TELEMETRY_BATCH_SIZE,
+                 enabled: bool = TELEMETRY_ENABLED):
+        self.path = path
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self._buffer = []
+        self._runs = {}   # run_id -> records, until run_summary() takes them
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def record(self, kind: str, duration_seconds: float, **fields):
+        if not self.enabled:
+            return
+        row = dict.fromkeys(FIELDS)
+        row.update(
+            timestamp=datetime.now().isoformat(timespec="milliseconds"),
+            run_id=RUN_ID.get(),
+            step_id=STEP_ID.get(),
+            kind=kind,
+            duration_seconds=round(duration_seconds, 4),
+        )
+        row.update(fields)
+
+        with self._lock:
+            self._buffer.append(row)
+            if row["run_id"] is not None:
+                self._runs.setdefault(row["run_id"], []).append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def record_llm(self, agent: str, model: str, usage, duration_seconds: float, error: str = None):
+        """
+        One LLM call; a call that raised has no usage and its exception type as `error`.
+        """
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.record(
+            "llm", duration_seconds,
+            agent=agent,
+            model=model,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            cached_tokens=getattr(details, "cached_tokens", None),
+            total_tokens=getattr(usage, "total_tokens", None),
+            success=error is None,
+            error=error,
+        )
+
+    def flush(self):
+        """
+        Append the buffered records to the CSV store.
+        """
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+        with self._write_lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            file_exists = os.path.exists(self.path)
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                if not file_exists:
+                    writer.writeheader()
+                writer.writerows(rows)
+
+    def drain(self) -> list:
+        """
+        Take the buffered records instead of writing them (executor workers
+        hand theirs to the parent process, which records them in its run).
+        """
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        return rows
+
+    def run_summary(self, run_id: str) -> dict:
+        """
+        Per-run report: wall time, time spent in LLM calls, tool execution
+        (and the part of it spent rendering figures) and data loading (in total, per step and per agent), and token
+        counts. The run's records are released afterwards.
+        """
+        with self._lock:
+            records = self._runs.pop(run_id, [])
+
+        def totals(rows):
+            return {
+                "llm_calls": sum(r["kind"] == "llm" for r in rows),
+                "llm_errors": sum(r["kind"] == "llm" and r["success"] is False for r in rows),
+                "llm_seconds": round(sum(r["duration_seconds"] for r in rows if r["kind"] == "llm"), 3),
+                "tool_calls": sum(r["kind"] == "tool" for r in rows),
+                "tool_seconds": round(sum(r["duration_seconds"] for r in rows if r["kind"] == "tool"), 3),
+                "figure_render_seconds": round(
+                    sum(r["duration_seconds"] for r in rows if r["kind"] == "figure_render"), 3
+                ),
+                "data_load_seconds": round(sum(r["duration_seconds"] for r in rows if r["kind"] == "data_load"), 3),
+            }
+
+        summary = {
+            "run_id": run_id,
+            "wall_seconds": next((r["duration_seconds"] for r in records if r["kind"] == "run"), None),
+            **totals(records),
+        }
+        for field in ["prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens"]:
+            summary[field] = sum(r[field] or 0 for r in records if r["kind"] == "llm")
+
+        step_ids = sorted({r["step_id"] for r in records if r["step_id"] is not None}, key=str)
+        summary["steps"] = {
+            step_id: totals([r for r in records if r["step_id"] == step_id])
+            for step_id in step_ids
+        }
+        agents = sorted({r["agent"] for r in records if r["agent"] is not None})
+        summary["agents"] = {
+            agent: totals([r for r in records if r["agent"] == agent])
+            for agent in agents
+        }
+        return summary
+
+
+TELEMETRY = Telemetry()
+atexit.register(TELEMETRY.flush)
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+@contextmanager
+def run_context(run_id: str = None):
+    """
+    Tag everything recorded inside the block with a run id; the run's own
+    wall time is recorded when the block exits.
+    """
+    run_id = run_id or new_run_id()
+    token = RUN_ID.set(run_id)
+    start = time.perf_counter()
+    success = False
+    try:
+        yield run_id
+        success = True
+    finally:
+        TELEMETRY.record("run", time.perf_counter() - start, success=success)
+        RUN_ID.reset(token)
+
+
+@contextmanager
+def step_context(step_id):
+    token = STEP_ID.set(step_id)
+    try:
+        yield step_id
+    finally:
+        STEP_ID.reset(token)
+
+
+def format_run_report(summary: dict) -> str:
+    """
+    Human-readable version of a run_summary() dict.
+    """
+    lines = [
+        f"Run {summary['run_id']}: {summary['wall_seconds']}s wall",
+        f"  LLM:  {summary['llm_calls']} calls ({summary['llm_errors']} failed), {summary['llm_seconds']}s, "
+        f"{summary['prompt_tokens']} prompt ({summary['cached_tokens']} cached) / "
+        f"{summary['completion_tokens']} completion tokens",
+        f"  Code: {summary['tool_calls']} calls, {summary['tool_seconds']}s "
+        f"({summary['figure_render_seconds']}s rendering figures)",
+        f"  Data loading: {summary['data_load_seconds']}s",
+    ]
+    for step_id, step in summary["steps"].items():
+        lines.append(
+            f"  Step {step_id}: LLM {step['llm_seconds']}s ({step['llm_calls']} calls), "
+            f"code {step['tool_seconds']}s, data {step['data_load_seconds']}s"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from compaction import compact_tool_result, summarize_dataframe, truncate_text
+from metadata import estimate_tokens
+
+BUDGET = 2000
+
+
+def test_small_result_is_unchanged():
+    result = {"success": True, "stdout": "hi", "figures": []}
+    assert compact_tool_result(result) == json.dumps(result)
+
+
+def test_long_stdout_and_traceback_fit_the_budget():
+    result = {
+        "success": False,
+        "stdout": "row\n" * 20000,
+        "error": "KeyError: " + "x" * 20000 + " END",
+        "error_type": "KeyError",
+        "traceback": "Traceback\n" + "  frame\n" * 3000 + "KeyError: 'b'",
+    }
+    content = compact_tool_result(result, token_budget=BUDGET)
+    assert estimate_tokens(content) <= BUDGET
+    payload = json.loads(content)
+    assert payload["compacted"] is True
+    assert payload["error_type"] == "KeyError"
+    assert payload["traceback"].endswith("KeyError: 'b'")
+    assert payload["error"].endswith("END")
+
+
+def test_many_strings_just_over_the_minimum_terminate():
+    # Strings of 201-240 characters cannot be cut any shorter
+    result = {"success": True, "result_meta": {f"note_{i}": "n" * (201 + i % 40) for i in range(200)}}
+    content = compact_tool_result(result, token_budget=BUDGET)
+    assert estimate_tokens(content) <= BUDGET
+
+
+def test_long_list_of_scalars_fits_the_budget():
+    content = compact_tool_result({"success": True, "values": ["abc"] * 5000}, token_budget=BUDGET)
+    assert estimate_tokens(content) <= BUDGET
+    assert json.loads(content)["values"]
+
+
+def test_unshrinkable_result_is_hard_capped():
+    result = {f"k{i}": i for i in range(5000)}
+    content = compact_tool_result(result, token_budget=200)
+    assert estimate_tokens(content) <= 200
+
+
+def test_dataframes_are_summarized():
+    df = pd.DataFrame({
+        "year": pd.to_datetime(["2012", "2013"] * 20),
+        "n": np.arange(40),
+        "state": list("ab") * 20,
+    })
+    summary = json.loads(compact_tool_result({"success": True, "table": df}))["table"]
+    assert summary["shape"] == [40, 3]
+    assert summary["dtypes"]["n"] == "int64"
+    assert len(summary["head"]) == len(summary["tail"]) == 5
+    assert summary["tail"][-1]["n"] == 39
+    assert summary["describe"]["n"]["max"] == 39
+
+
+def test_wide_dataframe_summary_caps_columns():
+    summary = summarize_dataframe(pd.DataFrame(np.ones((3, 100))))
+    assert summary["shape"] == [3, 100]
+    assert summary["columns_omitted"] == 70
+    assert len(summary["dtypes"]) == 30
+
+
+def test_truncate_text_keeps_both_ends():
+    text = "A" * 1000 + "B" * 1000
+    cut = truncate_text(text, 100, tail_share=0.5)
+    assert cut.startswith("A" * 200) and cut.endswith("B" * 200)
+    assert "1600 characters omitted" in cut
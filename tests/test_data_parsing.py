@@ -0,0 +1,129 @@
+import os
+
+import pandas as pd
+import pytest
+
+import data_parsing
+from data_parsing import (
+    PANEL_DTYPES,
+    load_soi_panel,
+    parse_files,
+    parse_soi_file,
+    parse_raw_column,
+    parse_state_flow_file,
+    rebuild_family,
+    write_panel_parquet,
+)
+
+RAW_DIR = data_parsing.DATA_DIR
+KEYS = ["statefips", "state", "state_name", "agi_stub", "class", "age_class"]
+
+
+def _sample_inmigall(tmp_path, name, source="1112inmigall.csv", rows=4, scale=1):
+    df = pd.read_csv(RAW_DIR / source, nrows=rows)
+    value_cols = [c for c in df.columns if parse_raw_column(c)[0] is not None]
+    df[value_cols] = df[value_cols] * scale
+    path = tmp_path / name
+    df.to_csv(path, index=False)
+    return path
+
+
+def _melt_reference(path):
+    """
+    The original melt + pivot_table implementation of parse_soi_file.
+    """
+    df = pd.read_csv(path)
+    id_cols = ["statefips", "state", "state_name", "agi_stub"]
+    long_df = df.melt(id_vars=id_cols, var_name="raw", value_name="value")
+    long_df[["class", "metric", "age_class"]] = long_df["raw"].apply(lambda x: pd.Series(parse_raw_column(x)))
+    wide = long_df.pivot_table(index=KEYS, columns="metric", values="value", aggfunc="sum").reset_index()
+    wide.insert(0, "year", data_parsing.extract_year_from_filename(path.name))
+    return wide[["year"] + KEYS + data_parsing.METRIC_COLS]
+
+
+def test_parse_soi_file_matches_melt_reference(tmp_path):
+    path = _sample_inmigall(tmp_path, "1112inmigall.csv")
+    fast = parse_soi_file(path).sort_values(KEYS).reset_index(drop=True)
+    reference = _melt_reference(path).sort_values(KEYS).reset_index(drop=True)
+    fast.columns.name = reference.columns.name = None
+    pd.testing.assert_frame_equal(fast, reference, check_dtype=False)
+
+
+def test_parse_files_keeps_input_order(tmp_path):
+    paths = [
+        _sample_inmigall(tmp_path, "1213inmigall.csv", source="1213inmigall.csv"),
+        _sample_inmigall(tmp_path, "1112inmigall.csv"),
+    ]
+    pooled = parse_files(parse_soi_file, paths, max_workers=2, verbose=False)
+    serial = parse_files(parse_soi_file, paths, max_workers=1, verbose=False)
+    assert [int(df["year"].iloc[0]) for df in pooled] == [2013, 2012]
+    for a, b in zip(pooled, serial):
+        pd.testing.assert_frame_equal(a, b)
+
+
+def test_panel_parquet_round_trip(tmp_path):
+    panel = parse_soi_file(_sample_inmigall(tmp_path, "1112inmigall.csv"))
+    root = tmp_path / "panel"
+    write_panel_parquet(panel, root=root)
+    loaded = load_soi_panel(root=root)
+    assert len(loaded) == len(panel)
+    assert loaded["n1"].sum() == panel["n1"].sum()
+    assert str(loaded["class"].dtype) == PANEL_DTYPES["class"]
+    assert load_soi_panel(root=root, years=[2013]).empty
+
+
+def test_state_flow_summary_rows_are_labelled():
+    flows = parse_state_flow_file(RAW_DIR / "stateinflow1112.csv")
+    assert set(flows["year"]) == {2012}
+    summary = flows[flows["flow_type"] != "state"]
+    assert {"total_us_foreign", "total_us", "nonmigrant"} <= set(summary["flow_type"])
+    assert summary["orig_state"].isna().all()
+    assert (flows["n1"].dropna() >= 0).all()
+
+
+@pytest.fixture
+def raw_dir(tmp_path, monkeypatch):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    monkeypatch.setattr(data_parsing, "DATA_DIR", raw)
+    return raw
+
+
+def test_incremental_rebuild(tmp_path, raw_dir):
+    root = tmp_path / "panel"
+
+    def rebuild(manifest):
+        return rebuild_family(
+            "inmigall", "*inmigall*.csv", parse_soi_file,
+            lambda df: write_panel_parquet(df, root=root), [root], manifest, max_workers=1,
+        )
+
+    _sample_inmigall(raw_dir, "1112inmigall.csv")
+    second = _sample_inmigall(raw_dir, "1213inmigall.csv", source="1213inmigall.csv")
+    changed, manifest = rebuild({})
+    assert changed == [2012, 2013]
+
+    # Nothing changed, then only the mtime changed: nothing to parse
+    assert rebuild(manifest)[0] == []
+    os.utime(second, ns=(second.stat().st_atime_ns, second.stat().st_mtime_ns + 10**9))
+    changed, manifest = rebuild(manifest)
+    assert changed == []
+
+    # New content: only that year is rebuilt
+    _sample_inmigall(raw_dir, "1213inmigall.csv", source="1213inmigall.csv", scale=2)
+    changed, manifest = rebuild(manifest)
+    assert changed == [2013]
+    assert load_soi_panel(root=root, years=[2013])["n1"].sum() == 2 * parse_soi_file(
+        _sample_inmigall(tmp_path, "1213inmigall.csv", source="1213inmigall.csv"))["n1"].sum()
+
+    # A renamed file keeps its year's partition
+    second.rename(raw_dir / "1213inmigall_v2.csv")
+    changed, manifest = rebuild(manifest)
+    assert (root / "year=2013").exists()
+
+    # A deleted file's year is dropped
+    (raw_dir / "1213inmigall_v2.csv").unlink()
+    changed, manifest = rebuild(manifest)
+    assert changed == [2013]
+    assert not (root / "year=2013").exists()
+    assert (root / "year=2012").exists()
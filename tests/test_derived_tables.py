@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import CPI_BASE_YEAR
+from data_parsing import PANEL_PARQUET_DIR, load_soi_panel
+from derived_tables import (
+    CLASSES,
+    add_rate_columns,
+    add_real_agi_columns,
+    build_metrics_year,
+    build_rollups_year,
+    pivot_classes,
+)
+
+KEYS = ["year", "statefips", "agi_stub", "age_class"]
+
+
+def _panel(values):
+    """
+    A one-state panel: class -> n1 (n2 = 2 * n1, AGI = 10 * n1).
+    """
+    rows = [
+        {"year": 2020, "statefips": 27, "agi_stub": 0, "age_class": 0, "class": cls,
+         "n1": n1, "n2": 2 * n1, "y1_agi": 10 * n1, "y2_agi": 10 * n1}
+        for cls, n1 in values.items()
+    ]
+    return pd.DataFrame(rows)
+
+
+def test_rate_formulas():
+    wide = add_rate_columns(pivot_classes(
+        _panel({"inflow": 30, "outflow": 10, "total": 200, "nonmig": 160, "samest": 5}), KEYS,
+    ))
+    row = wide.iloc[0]
+    assert row["net_n1"] == 20
+    assert row["inflow_rate"] == pytest.approx(0.15)
+    assert row["outflow_rate"] == pytest.approx(0.05)
+    assert row["net_migration_rate"] == pytest.approx(0.1)
+    assert row["net_n2"] == 40
+    assert row["net_migration_rate_n2"] == pytest.approx(0.1)
+    assert row["net_fagi"] == 200
+    assert row["inflow_agi_share"] == pytest.approx(0.15)
+
+
+def test_rates_over_an_empty_base_are_missing():
+    wide = add_rate_columns(pivot_classes(
+        _panel({"inflow": 0, "outflow": 0, "total": 0, "nonmig": 0, "samest": 0}), KEYS,
+    ))
+    assert np.isnan(wide["inflow_rate"].iloc[0])
+    assert not np.isinf(wide[["inflow_rate", "outflow_agi_share"]]).any().any()
+
+
+def test_real_agi_uses_the_base_year_deflator():
+    wide = pd.DataFrame({c: [100.0] for c in ["inflow_y2_agi", "outflow_y2_agi", "total_y2_agi", "net_fagi"]})
+    cpi = pd.DataFrame({"year": [2020, CPI_BASE_YEAR], "cpi_u": [250.0, 300.0]})
+    wide = add_real_agi_columns(wide, 2020, cpi)
+    assert wide["deflator"].iloc[0] == pytest.approx(1.2)
+    assert wide["real_net_fagi"].iloc[0] == pytest.approx(120.0)
+    # A year without CPI data gets no real values
+    assert np.isnan(add_real_agi_columns(wide.copy(), 1990, cpi)["deflator"].iloc[0])
+
+
+needs_panel = pytest.mark.skipif(
+    not (PANEL_PARQUET_DIR / "year=2012").exists(), reason="processed panel not built"
+)
+
+
+@needs_panel
+def test_metrics_match_the_panel():
+    metrics = build_metrics_year(2012)
+    panel = load_soi_panel(years=[2012])
+    for cls in CLASSES:
+        assert metrics[f"{cls}_n1"].sum() == panel.loc[panel["class"] == cls, "n1"].sum()
+    assert (metrics["net_n1"] == metrics["inflow_n1"] - metrics["outflow_n1"]).all()
+
+
+@needs_panel
+def test_rollups_are_ratios_of_sums():
+    rollups = build_rollups_year(2012)
+    metrics = build_metrics_year(2012)
+    national = rollups[rollups["geo_level"] == "national"].set_index(["agi_stub", "age_class"])
+    states = metrics.groupby(["agi_stub", "age_class"])[["inflow_n1", "total_n1"]].sum()
+
+    assert (national["inflow_n1"] == states["inflow_n1"]).all()
+    expected = states["inflow_n1"] / states["total_n1"]
+    pd.testing.assert_series_equal(national["inflow_rate"], expected, check_names=False)
+
+    # Every level covers the same people
+    totals = rollups.groupby("geo_level", observed=True)["total_n1"].sum()
+    assert totals.nunique() == 1
+
@@ -0,0 +1,70 @@
+import signal
+
+import pytest
+
+import executor
+import tools
+from executor import WorkerPool
+from tools import ExecutionLimitExceeded, _execute_inline
+
+resource = pytest.importorskip("resource")
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(size=1, preload=[])
+    yield pool
+    pool.shutdown()
+
+
+def test_wall_clock_limit_kills_the_worker_and_resets_the_session(pool, monkeypatch):
+    monkeypatch.setattr(executor, "EXECUTION_TIMEOUT_SECONDS", 1)
+    env = {}
+    assert pool.run(env, "kept = 1")["success"]
+    result = pool.run(env, "import time\ntime.sleep(30)")
+    assert result["error_type"] == "LimitExceeded"
+    assert result["limit"] == "wall_clock_seconds"
+    assert result["execution_time_seconds"] < 10
+
+    result = pool.run(env, "result_meta = {'kept': 'kept' in dir()}")
+    assert result["success"]
+    assert result["environment_reset"] is True
+    assert env["result_meta"] == {"kept": False}
+
+
+def test_memory_limit(pool, monkeypatch):
+    monkeypatch.setattr(executor, "EXECUTION_MAX_MEMORY_MB", 600)
+    result = pool.run({}, "import time\nblock = np.ones((1024, 1024, 128))\ntime.sleep(30)")
+    assert result["limit"] == "memory_mb"
+
+
+def test_result_rows_limit(monkeypatch):
+    monkeypatch.setattr(tools, "EXECUTION_MAX_RESULT_ROWS", 10)
+    env = {}
+    result = _execute_inline(env, "result_df = pd.DataFrame({'a': range(11)})")
+    assert result["limit"] == "result_rows"
+    # An oversized table is never picked up as the step's result
+    assert "result_df" not in env
+
+
+def test_output_is_capped(monkeypatch):
+    monkeypatch.setattr(tools, "EXECUTION_MAX_OUTPUT_CHARS", 100)
+    result = _execute_inline({}, "print('x' * 1000)")
+    assert result["success"]
+    assert result["output_truncated"] is True
+    assert result["stdout"].startswith("x" * 100)
+    assert "901 more characters" in result["stdout"]
+
+
+def test_cpu_limit():
+    def on_cpu_limit(signum, frame):
+        raise ExecutionLimitExceeded("cpu_seconds", 1, "CPU limit")
+
+    handler = signal.signal(signal.SIGXCPU, on_cpu_limit)
+    previous = executor._cpu_limit(1)
+    try:
+        result = _execute_inline({}, "x = 0\nwhile True:\n    x += 1")
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, previous)
+        signal.signal(signal.SIGXCPU, handler)
+    assert result["limit"] == "cpu_seconds"
@@ -0,0 +1,105 @@
+import gc
+
+import pandas as pd
+import pytest
+
+from executor import RETURNED_NAMES, WorkerPool
+from telemetry import TELEMETRY, new_run_id, run_context
+from tools import _execute_inline
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = WorkerPool(size=1, preload=[])
+    yield pool
+    pool.shutdown()
+
+
+def _inline(env, code):
+    return _execute_inline(env=env, code=code)
+
+
+@pytest.fixture(params=["process", "inline"])
+def run(request, pool):
+    if request.param == "process":
+        return pool.run
+    return _inline
+
+
+def test_functions_and_imports_persist(run):
+    env = {}
+    assert run(env, "import math\ndef double(x):\n    return 2 * x\n")["success"]
+    result = run(env, "result_df = pd.DataFrame({'v': [double(math.floor(1.5))]})")
+    assert result["success"], result
+    assert env["result_df"]["v"].tolist() == [2]
+
+
+def test_rebound_input_persists(run):
+    env = {"panel": pd.DataFrame({"year": [2019, 2020, 2021]})}
+    assert run(env, "panel = panel[panel['year'] > 2019]")["success"]
+    assert run(env, "result_df = panel")["success"]
+    assert env["result_df"]["year"].tolist() == [2020, 2021]
+
+
+def test_in_place_mutation_persists(run):
+    env = {"df": pd.DataFrame({"a": [1, 2]})}
+    assert run(env, "df['b'] = df['a'] * 10")["success"]
+    assert run(env, "result_df = df[['b']]")["success"]
+    assert env["result_df"]["b"].tolist() == [10, 20]
+
+
+def test_caller_updates_reach_the_namespace(run):
+    env = {"x": 1}
+    assert run(env, "y = x + 1")["success"]
+    env["x"] = 10
+    assert run(env, "result_meta = {'y': y, 'x': x}")["success"]
+    assert env["result_meta"] == {"y": 2, "x": 10}
+
+
+def test_deleted_result_is_removed(run):
+    env = {}
+    assert run(env, "result_meta = {'a': 1}")["success"]
+    assert run(env, "del result_meta")["success"]
+    assert "result_meta" not in env
+
+
+def test_process_returns_only_results(pool):
+    env = {}
+    assert pool.run(env, "scratch = pd.DataFrame({'a': [1]})\nresult_df = scratch")["success"]
+    assert "scratch" not in env
+    assert set(RETURNED_NAMES) & set(env) == {"result_df"}
+
+
+def test_sessions_are_separate(pool):
+    first, second = {}, {}
+    assert pool.run(first, "value = 1")["success"]
+    result = pool.run(second, "result_meta = {'seen': 'value' in dir()}")
+    assert result["success"]
+    assert second["result_meta"] == {"seen": False}
+
+
+def test_collected_session_is_dropped(pool):
+    env = {}
+    assert pool.run(env, "value = 1")["success"]
+    worker = env["__executor_session__"].state["worker"]
+    del env
+    gc.collect()
+    assert not worker.sessions
+    assert worker.drops
+
+
+def test_worker_dataset_loads_are_recorded_in_the_run(pool):
+    run_id = new_run_id()
+    with run_context(run_id):
+        result = pool.run({}, "result_meta = {'rows': len(cpi_u)}", preload_datasets=True)
+    assert result["success"], result
+    loads = [r for r in TELEMETRY._runs[run_id] if r["kind"] == "data_load"]
+    TELEMETRY.run_summary(run_id)
+    assert [r["name"] for r in loads] == ["cpi_u"]
+
+
+def test_figures_come_back_with_their_render_time(run):
+    result = run({}, "plt.plot([1, 2, 3])")
+    assert result["success"], result
+    assert len(result["figures"]) == 1
+    assert result["render_seconds"] > 0
@@ -0,0 +1,53 @@
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from figure_cache import FigureCache, pack_figures, unpack_figures, FIGURE_CACHE
+
+
+def test_identical_images_are_stored_once():
+    cache = FigureCache(max_bytes=100)
+    first = cache.put(b"x" * 10, "png")
+    second = cache.put(b"x" * 10, "png")
+    assert first == second
+    assert cache._total_bytes == 10
+
+
+def test_least_recently_used_images_are_evicted():
+    cache = FigureCache(max_bytes=25)
+    a = cache.put(b"a" * 10, "png")
+    b = cache.put(b"b" * 10, "png")
+    cache.get(a)                        # a is now more recent than b
+    c = cache.put(b"c" * 10, "png")
+    assert cache.get(b) is None
+    assert cache.get(a) == b"a" * 10
+    assert cache.get(c) == b"c" * 10
+    assert cache._total_bytes == 20
+
+
+def test_an_image_larger_than_the_cache_is_kept_alone():
+    cache = FigureCache(max_bytes=5)
+    cache.put(b"a" * 3, "png")
+    big = cache.put(b"b" * 10, "png")
+    assert cache.get(big) == b"b" * 10
+    assert len(cache._entries) == 1
+
+
+def test_pop_releases_bytes():
+    cache = FigureCache(max_bytes=100)
+    ref = cache.put(b"a" * 10, "png")
+    assert cache.pop(ref) == b"a" * 10
+    assert cache.pop(ref) is None
+    assert cache._total_bytes == 0
+
+
+def test_pack_and_unpack_round_trip():
+    fig, ax = plt.subplots()
+    ax.plot([1, 2, 3])
+    ref = FIGURE_CACHE.put_figure(fig, fmt="png")
+    plt.close(fig)
+    payloads = pack_figures([ref])
+    assert FIGURE_CACHE.get(ref) is None
+    assert payloads[0][1].startswith(b"\x89PNG")
+    assert unpack_figures(payloads) == [ref]
@@ -0,0 +1,113 @@
+import pandas as pd
+import pytest
+
+import query_engine
+from dataset_cache import DATASET_CACHE
+from query_engine import execute_query, run_query
+
+FLOWS = pd.DataFrame({
+    "year": [2020, 2020, 2021, 2021, 2021],
+    "state": ["MN", "TX", "MN", "TX", "TX"],
+    "class": ["inflow", "inflow", "inflow", "outflow", "inflow"],
+    "n1": [10, 20, 30, pd.NA, 50],
+}).astype({"state": "category", "n1": "Int64"})
+STATES = pd.DataFrame({"state": ["MN", "TX"], "region": ["Midwest", "South"]})
+
+
+@pytest.fixture(autouse=True)
+def datasets(monkeypatch):
+    frames = {"flows": FLOWS, "states": STATES}
+    monkeypatch.setattr(DATASET_CACHE, "datasets", {name: (None, None) for name in frames})
+    monkeypatch.setattr(DATASET_CACHE, "get", frames.__getitem__)
+
+
+def test_grouped_metrics_with_metric_filter():
+    result = run_query({
+        "datasets": [{"name": "flows"}],
+        "group_by": ["state"],
+        "metrics": [
+            {"name": "total", "agg": "sum", "column": "n1"},
+            {"name": "outflow", "agg": "sum", "column": "n1", "filter": {"class": "outflow"}},
+        ],
+    })
+    assert result["state"].tolist() == ["MN", "TX"]
+    assert result["total"].tolist() == [40, 70]
+    # No matching rows: missing, not 0
+    assert result["outflow"].isna().all()
+
+
+def test_filters_skip_missing_values():
+    result = run_query({
+        "datasets": [{"name": "flows"}],
+        "filters": {"n1": {"gte": 20}},
+        "metrics": [{"name": "rows", "agg": "count", "column": "n1"}],
+    })
+    assert result["rows"].tolist() == [3]
+
+
+def test_join_derived_sort_and_limit():
+    result = run_query({
+        "datasets": [{"name": "flows", "alias": "f"}, {"name": "states", "alias": "s"}],
+        "joins": [{"left_dataset": "f", "right_dataset": "s", "on": [{"left_column": "state", "right_column": "state"}]}],
+        "group_by": ["region"],
+        "metrics": [{"name": "total", "agg": "sum", "column": "n1"}],
+        "derived_columns": [{"name": "double", "expression": "total * 2"}],
+        "sort": [{"column": "total", "direction": "desc"}],
+        "limit": 1,
+    })
+    assert result.to_dict(orient="records") == [{"region": "South", "total": 70, "double": 140}]
+
+
+def test_select_returns_filtered_rows_projected():
+    result = run_query({
+        "datasets": [{"name": "flows"}],
+        "filters": {"state": "TX"},
+        "columns": ["year", "n1"],
+        "sort": [{"column": "year", "direction": "desc"}],
+    })
+    assert list(result.columns) == ["year", "n1"]
+    assert result["year"].tolist() == [2021, 2021, 2020]
+    assert result.index.tolist() == [0, 1, 2]
+
+
+def test_select_does_not_touch_the_cached_table():
+    result = run_query({"datasets": [{"name": "flows"}], "limit": 2})
+    result["n1"] = 0
+    assert len(result) == 2
+    assert FLOWS["n1"].iloc[0] == 10
+
+
+def test_select_row_cap(monkeypatch):
+    monkeypatch.setattr(query_engine, "QUERY_MAX_RESULT_ROWS", 3)
+    with pytest.raises(ValueError, match="more than 3 rows"):
+        run_query({"datasets": [{"name": "flows"}]})
+    assert len(run_query({"datasets": [{"name": "flows"}], "limit": 3})) == 3
+
+
+@pytest.mark.parametrize("query, message", [
+    ({"datasets": []}, "No datasets"),
+    ({"datasets": [{"name": "nope"}]}, "Unknown dataset"),
+    ({"datasets": [{"name": "flows"}], "filters": {"nope": 1}}, "Filter column"),
+    ({"datasets": [{"name": "flows"}], "filters": {"n1": {"like": 1}}}, "Unsupported filter op"),
+    ({"datasets": [{"name": "flows"}], "group_by": ["nope"]}, "group_by columns"),
+    ({"datasets": [{"name": "flows"}], "columns": ["nope"]}, "Selected columns"),
+    ({"datasets": [{"name": "flows"}], "metrics": [{"name": "m", "agg": "median", "column": "n1"}]},
+     "Unsupported aggregation"),
+    ({"datasets": [{"name": "flows"}], "metrics": [{"name": "m", "agg": "sum", "column": "nope"}]},
+     "Metric column"),
+    ({"datasets": [{"name": "flows"}, {"name": "states"}]}, "no joins"),
+    ({"datasets": [{"name": "flows"}], "limit": "ten"}, "Invalid limit"),
+])
+def test_invalid_queries_raise(query, message):
+    with pytest.raises(ValueError, match=message):
+        run_query(query)
+
+
+def test_execute_query_reports_errors():
+    result = execute_query({
+        "datasets": [{"name": "flows"}],
+        "metrics": [{"name": "m", "agg": "sum", "column": "n1"}],
+        "derived_columns": [{"name": "bad", "expression": "m +"}],
+    })
+    assert result["success"] is False
+    assert result["error_type"]
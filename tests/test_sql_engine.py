@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from compaction import summarize_dataframe
+from sql_engine import query_sql, run_sql
+
+
+def test_results_use_numpy_dtypes():
+    df = query_sql(
+        "SELECT 'MN' AS state, 2020 AS year, SUM(x) AS total, AVG(x) AS mean "
+        "FROM (VALUES (1::BIGINT), (2::BIGINT)) t(x)"
+    )
+    assert df.dtypes.to_dict() == {
+        "state": "object", "year": "int32", "total": "int64", "mean": "float64",
+    }
+    summary = summarize_dataframe(df)
+    assert set(summary["describe"]) == {"year", "total", "mean"}
+
+
+def test_only_one_select_is_accepted():
+    with pytest.raises(ValueError):
+        query_sql("CREATE TABLE t AS SELECT 1")
+    with pytest.raises(ValueError):
+        query_sql("SELECT 1; SELECT 2")
+
+
+def test_run_sql_reports_errors():
+    result = run_sql("SELECT nope FROM nowhere")
+    assert result["success"] is False
+    assert "available_views" in result
+
+
+def test_run_sql_preview():
+    result = run_sql("SELECT * FROM range(3) t(i)")
+    assert result["success"]
+    assert result["rows"] == [{"i": 0}, {"i": 1}, {"i": 2}]
+    assert isinstance(result["dataframe"], pd.DataFrame)
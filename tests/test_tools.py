@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib.pyplot as plt
+
+from figure_cache import FIGURE_CACHE
+from tools import _execute_inline
+
+CODE = """
+import time
+for i in range(3):
+    print(f"tag={tag} i={i}")
+    time.sleep(0.01)
+fig, ax = plt.subplots()
+ax.plot([1, 2, tag])
+plt.title(f"title-{tag}")
+if tag % 3 == 0:
+    plt.figure()
+    plt.close("all")
+    plt.figure()
+    plt.suptitle(f"after-close-{tag}")
+result_df = pd.DataFrame({"tag": [tag]})
+"""
+
+
+def _run(tag):
+    env = {"tag": tag}
+    result = _execute_inline(env, CODE)
+    assert result["success"], result
+    return env, result
+
+
+def test_threads_get_their_own_output_and_figures():
+    with ThreadPoolExecutor(8) as pool:
+        runs = list(pool.map(_run, range(24)))
+
+    keys = set()
+    for tag, (env, result) in enumerate(runs):
+        assert result["stdout"].splitlines() == [f"tag={tag} i={i}" for i in range(3)]
+        assert len(result["figures"]) == 1
+        assert FIGURE_CACHE.get(result["figures"][0]).startswith(b"\x89PNG")
+        assert env["result_df"]["tag"].tolist() == [tag]
+        keys.add(result["figures"][0].key)
+    assert len(keys) == len(runs)
+    # Figures are released once rendered
+    assert plt.get_fignums() == []
+
+
+def test_error_keeps_output_and_traceback():
+    result = _execute_inline({}, "print('before')\n1 / 0")
+    assert result["success"] is False
+    assert result["error_type"] == "ZeroDivisionError"
+    assert result["stdout"] == "before\n"
+    assert "ZeroDivisionError" in result["traceback"]
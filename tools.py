@@ -3,34 +3,267 @@ import time
 import io, os, traceback
 import contextlib
 import sys
+import threading
+import warnings
+from collections import OrderedDict
 from typing import Any, Dict, List
 import pandas as pd
+import matplotlib
+# Figures are only ever rendered to files / images; GUI backends are not thread-safe
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+from matplotlib import _pylab_helpers
 from matplotlib.backends.backend_pdf import PdfPages
 
+from figure_cache import FIGURE_CACHE
+from config import (
+    EXECUTION_MODE,
+    EXECUTION_MAX_OUTPUT_CHARS,
+    EXECUTION_MAX_RESULT_ROWS,
+    EXECUTION_MAX_RESULT_MB,
+)
 
-def execute_python_code(env: dict = {}, code: str = "", verbose: bool = False) -> dict:
+# plt.show() is a no-op under Agg; generated code calls it all the time
+warnings.filterwarnings("ignore", message=".*non-interactive, and thus cannot be shown")
+
+
+class _ThreadLocalStream:
+    """
+    Stand-in for sys.stdout / sys.stderr that writes to the calling
+    thread's capture buffer while it runs generated code, and to the
+    original stream otherwise. Unlike contextlib.redirect_stdout, two
+    threads capturing at once do not see each other's output.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def _target(self):
+        buffer = getattr(self._local, "buffer", None)
+        return self._stream if buffer is None else buffer
+
+    def write(self, s):
+        return self._target().write(s)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+class _PerCallFigures:
+    """
+    Stand-in for pyplot's figure registry (Gcf.figs, one OrderedDict per
+    process) that gives every running execution a registry of its own, so
+    plt.figure / plt.gcf / plt.close("all") in generated code only see the
+    figures of that execution. Threads not running generated code share
+    the original registry.
+    """
+
+    def __init__(self, shared: OrderedDict):
+        self._shared = shared
+        self._local = threading.local()
+
+    def _figs(self) -> OrderedDict:
+        figs = getattr(self._local, "figs", None)
+        return self._shared if figs is None else figs
+
+    def __getattr__(self, name):
+        return getattr(self._figs(), name)
+
+    def __contains__(self, key):
+        return key in self._figs()
+
+    def __len__(self):
+        return len(self._figs())
+
+    def __iter__(self):
+        return iter(self._figs())
+
+    def __getitem__(self, key):
+        return self._figs()[key]
+
+    def __setitem__(self, key, value):
+        self._figs()[key] = value
+
+    def __delitem__(self, key):
+        del self._figs()[key]
+
+
+_STREAM_LOCK = threading.Lock()
+if not isinstance(_pylab_helpers.Gcf.figs, _PerCallFigures):
+    _pylab_helpers.Gcf.figs = _PerCallFigures(_pylab_helpers.Gcf.figs)
+
+
+def _thread_local_stream(name: str) -> _ThreadLocalStream:
+    # Re-installed if something (a test runner, Streamlit) replaced sys.stdout since
+    with _STREAM_LOCK:
+        stream = getattr(sys, name)
+        if not isinstance(stream, _ThreadLocalStream):
+            stream = _ThreadLocalStream(stream)
+            setattr(sys, name, stream)
+        return stream
+
+
+@contextlib.contextmanager
+def _captured_output(stdout_buf, stderr_buf):
+    """
+    Send this thread's stdout / stderr to the given buffers.
+    """
+    streams = [(_thread_local_stream("stdout"), stdout_buf), (_thread_local_stream("stderr"), stderr_buf)]
+    for stream, buffer in streams:
+        stream._local.buffer = buffer
+    try:
+        yield
+    finally:
+        for stream, _ in streams:
+            stream._local.buffer = None
+
+
+@contextlib.contextmanager
+def _figure_scope():
+    """
+    Give this thread an empty pyplot figure registry; yields it so the
+    figures created inside can be collected.
+    """
+    registry = _pylab_helpers.Gcf.figs
+    previous = getattr(registry._local, "figs", None)
+    registry._local.figs = OrderedDict()
+    try:
+        yield registry._local.figs
+    finally:
+        registry._local.figs = previous
+
+
+class ExecutionLimitExceeded(Exception):
+    """
+    Generated code hit one of the EXECUTION_* limits (see config.py).
+    """
+
+    def __init__(self, limit: str, value, message: str):
+        super().__init__(message)
+        self.limit = limit
+        self.value = value
+
+
+def limit_exceeded_result(limit: str, value, message: str, stdout: str = "", stderr: str = "",
+                          elapsed: float = 0.0) -> dict:
+    """
+    The result dict of an execution stopped by a limit. The error message
+    says what to change, so the agent can retry with cheaper code.
+    """
+    return {
+        "success": False,
+        "stdout": stdout,
+        "stderr": stderr,
+        "execution_time_seconds": round(elapsed, 4),
+        "error": message,
+        "error_type": "LimitExceeded",
+        "limit": limit,
+        "limit_value": value,
+    }
+
+
+class _CappedBuffer(io.StringIO):
+    """
+    Output buffer that keeps the first `max_chars` characters and only
+    counts the rest, so runaway printing cannot exhaust memory.
+    """
+
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+        self.dropped = 0
+
+    def write(self, s):
+        room = self.max_chars - self.tell()
+        if len(s) <= room:
+            return super().write(s)
+        if room > 0:
+            super().write(s[:room])
+        self.dropped += len(s) - max(room, 0)
+        return len(s)
+
+    def text(self) -> str:
+        value = self.getvalue()
+        if self.dropped:
+            value += f"\n... [output truncated: {self.dropped} more characters]"
+        return value
+
+
+def _check_result_size(env: dict):
+    result_df = env.get("result_df")
+    if not isinstance(result_df, pd.DataFrame):
+        return
+    if len(result_df) > EXECUTION_MAX_RESULT_ROWS:
+        raise ExecutionLimitExceeded(
+            "result_rows", EXECUTION_MAX_RESULT_ROWS,
+            f"result_df has {len(result_df)} rows, more than the limit of {EXECUTION_MAX_RESULT_ROWS}. "
+            "Aggregate or filter so result_df holds only the final table.",
+        )
+    size_mb = result_df.memory_usage(deep=True).sum() / 2**20
+    if size_mb > EXECUTION_MAX_RESULT_MB:
+        raise ExecutionLimitExceeded(
+            "result_memory_mb", EXECUTION_MAX_RESULT_MB,
+            f"result_df uses {size_mb:.0f} MB, more than the limit of {EXECUTION_MAX_RESULT_MB} MB. "
+            "Keep only the columns and rows the answer needs.",
+        )
+
+def execute_python_code(env: dict = {}, code: str = "", verbose: bool = False, preload_datasets: bool = False) -> dict:
     """
     Execute arbitrary Python code in a given environment env.
 
+    With EXECUTION_MODE = "process" the code runs in a warm worker process
+    (see executor.py) that keeps env's namespace between calls, and only
+    result_df / result_meta are copied back into env; with "inline" it
+    runs in this process, directly in env. Either way it is safe to call
+    from many threads at once: each call captures its own stdout/stderr
+    and its own pyplot figures.
+
     Args:
         code: Python source code as a string.
         env: dict representing the execution environment (namespace).
         verbose: If True, print the code and its stdout to the local console.
+        preload_datasets: If True, cached datasets referenced by name in the
+            code (soi_panel, state_flows, cpi_u, ...) are added to env.
 
     Returns:
         dict with:
             - success: bool
             - stdout: captured standard output (str)
             - stderr: captured standard error (str)
-            - figures: list of matplotlib.figure.Figure objects
+            - figures: list of figure_cache.FigureRef (rendered images)
+            - render_seconds: part of the execution time spent rendering them
             - execution_time_seconds: float
             - error / error_type (only on failure)
     """
+    if EXECUTION_MODE != "process":
+        return _execute_inline(env=env, code=code, verbose=verbose, preload_datasets=preload_datasets)
+
+    from executor import POOL
+
+    if verbose:
+        print("\n[Executing Python Code]")
+        print("-" * 60)
+        print(code)
+        print("-" * 60)
+    result = POOL.run(env, code, preload_datasets=preload_datasets)
+    if verbose:
+        print(result.get("stdout", ""), end="")
+        print(result.get("stderr", "") or result.get("traceback", ""), end="")
+    return result
+
+def _execute_inline(env: dict, code: str = "", verbose: bool = False, preload_datasets: bool = False) -> dict:
+    """
+    In-process implementation of execute_python_code (also what the
+    worker processes run).
+    """
     start_time = time.time()
 
-    stdout_buf = io.StringIO()
-    stderr_buf = io.StringIO()
+    stdout_buf = _CappedBuffer(EXECUTION_MAX_OUTPUT_CHARS)
+    stderr_buf = _CappedBuffer(EXECUTION_MAX_OUTPUT_CHARS)
 
     pd = None
     np = None
@@ -44,6 +277,10 @@ def execute_python_code(env: dict = {}, code: str = "", verbose: bool = False) -
 
     env.update({"pd": pd, "np": np, "plt": plt, "sns": sns})
 
+    if preload_datasets:
+        from dataset_cache import DATASET_CACHE
+        env.update(DATASET_CACHE.namespace(code=code, env=env))
+
     if verbose:
         print("\n[Executing Python Code]")
         print("-" * 60)
@@ -51,33 +288,20 @@ def execute_python_code(env: dict = {}, code: str = "", verbose: bool = False) -
         print("-" * 60)
 
     try:
-        with contextlib.redirect_stdout(stdout_buf), contextlib.redirect_stderr(stderr_buf):
-            if plt is not None:
-                plt.show()
-                plt.close("all")
-            
-            # --- Monkey-patch plt.show so it doesn't clear figures ---
-            original_show = plt.show
-
-            def _noop_show(*args, **kwargs):
-                return
-
-            plt.show = _noop_show
-            try:
-                exec(code, env)
-            finally:
-                plt.show = original_show
-
-
-            if plt is not None:
-                figures = [plt.figure(num) for num in plt.get_fignums()]
-                if verbose:
-                    print(f"current plt figures: {plt.get_fignums()}")
-            else: 
-                figures = []
-        
-        stdout_output = stdout_buf.getvalue()
-        stderr_output = stderr_buf.getvalue()
+        # Output and figures are per call, so executions can run in many threads at once
+        with _captured_output(stdout_buf, stderr_buf), _figure_scope() as figure_managers:
+            exec(code, env)
+            _check_result_size(env)
+            # Rendered and released right away: results carry image refs, not Figures
+            render_start = time.perf_counter()
+            figures = [FIGURE_CACHE.put_figure(manager.canvas.figure) for manager in figure_managers.values()]
+            render_seconds = time.perf_counter() - render_start
+
+        if verbose:
+            print(f"figures created: {len(figures)}")
+
+        stdout_output = stdout_buf.text()
+        stderr_output = stderr_buf.text()
         elapsed = time.time() - start_time
 
         if verbose:
@@ -92,8 +316,21 @@ def execute_python_code(env: dict = {}, code: str = "", verbose: bool = False) -
             "stderr": stderr_output,
             "execution_time_seconds": round(elapsed, 4),
             "figures": figures,
+            "render_seconds": round(render_seconds, 4),
+            "output_truncated": bool(stdout_buf.dropped or stderr_buf.dropped),
         }
 
+    except ExecutionLimitExceeded as e:
+        if e.limit.startswith("result"):
+            # Never let an oversized table be picked up as the step's result
+            env.pop("result_df", None)
+        if verbose:
+            print(f"[LIMIT EXCEEDED] {e}")
+        return limit_exceeded_result(
+            e.limit, e.value, str(e),
+            stdout=stdout_buf.text(), stderr=stderr_buf.text(), elapsed=time.time() - start_time,
+        )
+
     except Exception as e:
         elapsed = time.time() - start_time
         tb_str = traceback.format_exc()
@@ -103,8 +340,8 @@ def execute_python_code(env: dict = {}, code: str = "", verbose: bool = False) -
 
         return {
             "success": False,
-            "stdout": stdout_buf.getvalue(),
-            "stderr": stderr_buf.getvalue(),
+            "stdout": stdout_buf.text(),
+            "stderr": stderr_buf.text(),
             "execution_time_seconds": round(elapsed, 4),
             "error": str(e),
             "error_type": type(e).__name__,
@@ -0,0 +1,121 @@
+"""
+OpenTelemetry tracing for the agent pipeline.
+
+A question produces one trace: a root "question" span with child spans
+for the orchestrator, every plan step, every agent run inside a step,
+every LLM call and every tool call (execute_python_code, execute_query,
+run_sql). Spans carry token counts, rows returned and DataFrame memory,
+so the critical path of a plan and the steps dominating its latency can
+be read off the trace.
+
+Spans are exported in batches to a JSON-lines file or the console (see
+TRACING_EXPORTER in config.py). The span context follows the work into
+plan-step threads through contextvars, like the telemetry run id. If the
+opentelemetry SDK is not installed, or tracing is disabled, span() is a
+no-op.
+"""
+import atexit
+import os
+from contextlib import contextmanager
+
+import pandas as pd
+
+from config import TRACING_ENABLED, TRACING_EXPORTER, TRACING_PATH
+
+try:
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.trace import Status, StatusCode
+except ImportError:  # tracing is optional
+    TracerProvider = None
+
+SERVICE_NAME = "irs-soi-migration-agent"
+
+
+class _NoSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+
+def _make_tracer():
+    if not TRACING_ENABLED or TRACING_EXPORTER == "none" or TracerProvider is None:
+        return None, None
+
+    if TRACING_EXPORTER == "file":
+        os.makedirs(os.path.dirname(TRACING_PATH) or ".", exist_ok=True)
+        out = open(TRACING_PATH, "a", encoding="utf-8")
+        # One span per line
+        exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+    else:
+        exporter = ConsoleSpanExporter()
+
+    # A provider of our own, so an application's global tracer setup is left alone
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    atexit.register(provider.shutdown)
+    return provider, provider.get_tracer(__name__)
+
+
+_provider, _tracer = _make_tracer()
+
+
+def _clean(attributes: dict) -> dict:
+    # OpenTelemetry attributes must be str / bool / int / float
+    return {k: v for k, v in attributes.items() if isinstance(v, (str, bool, int, float))}
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Run the block inside a span named `name` (a child of the current span).
+    Yields the span so more attributes can be set once results are known.
+    An exception leaving the block is recorded on the span and re-raised.
+    """
+    if _tracer is None:
+        yield _NoSpan()
+        return
+    with _tracer.start_as_current_span(name, attributes=_clean(attributes)) as current:
+        try:
+            yield current
+        except BaseException as e:
+            current.set_status(Status(StatusCode.ERROR, str(e)))
+            raise
+
+
+def set_attributes(current, **attributes):
+    current.set_attributes(_clean(attributes))
+
+
+def usage_attributes(usage) -> dict:
+    """
+    Token counts of a chat completion's usage object.
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "llm.prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "llm.completion_tokens": getattr(usage, "completion_tokens", None),
+        "llm.cached_tokens": getattr(details, "cached_tokens", None),
+        "llm.total_tokens": getattr(usage, "total_tokens", None),
+    }
+
+
+def dataframe_attributes(df, prefix: str = "result") -> dict:
+    """
+    Rows, columns and memory of a result table (nothing if df is not a DataFrame).
+    """
+    if not isinstance(df, pd.DataFrame):
+        return {}
+    return {
+        f"{prefix}.rows": int(len(df)),
+        f"{prefix}.columns": int(df.shape[1]),
+        f"{prefix}.memory_bytes": int(df.memory_usage(deep=True).sum()),
+    }
+
+
+def force_flush():
+    if _provider is not None:
+        _provider.force_flush()